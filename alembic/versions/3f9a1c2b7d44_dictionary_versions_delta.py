@@ -0,0 +1,144 @@
+"""Store dictionary versions as snapshots and deltas
+
+Revision ID: 3f9a1c2b7d44
+Revises: 7d041b3b8c99
+Create Date: 2026-10-18 10:12:41.512304
+
+"""
+import difflib
+import json
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c2b7d44'
+down_revision = '7d041b3b8c99'
+branch_labels = None
+depends_on = None
+
+# Копия формата версий на момент миграции, чтобы она не зависела от
+# изменений кода приложения (components_utils.version_history)
+SNAPSHOT_INTERVAL = 20
+
+
+versions = sa.table(
+    'dictionaries_versions',
+    sa.column('version_id'),
+    sa.column('id'),
+    sa.column('version'),
+    sa.column('content'),
+    sa.column('delta'),
+    sa.column('delta_depth'),
+)
+
+
+def upgrade():
+    op.add_column('dictionaries_versions', sa.Column('delta', sa.LargeBinary(), nullable=True))
+    op.add_column('dictionaries_versions', sa.Column('delta_depth', sa.Integer(), server_default='0', nullable=False))
+
+    # Сжатие существующей истории: версии каждого словаря переписываются
+    # в формат полных копий и разниц. После миграции место в таблице
+    # освобождается через VACUUM FULL dictionaries_versions.
+    connection = op.get_bind()
+    for dictionary_id in _dictionary_ids(connection):
+        updates = []
+        previous, previous_depth, previous_version = None, 0, None
+        for version_id, version, content in connection.execute(
+                sa.select([versions.c.version_id, versions.c.version, versions.c.content])
+                .where(versions.c.id == dictionary_id)
+                .order_by(versions.c.version, versions.c.version_id)):
+            if previous_version is not None and previous_version >= version:
+                previous = None
+
+            _, delta, depth = pack_version(previous, content, previous_depth,
+                                           SNAPSHOT_INTERVAL)
+            if delta is not None:
+                updates.append({"b_version_id": version_id, "b_delta": delta, "b_delta_depth": depth})
+
+            previous, previous_depth, previous_version = content, depth, version
+
+        _update(connection, updates, content=None)
+
+
+def downgrade():
+    # Восстановление полных копий content перед удалением колонок
+    connection = op.get_bind()
+    for dictionary_id in _dictionary_ids(connection):
+        updates = []
+        value = None
+        for version_id, content, delta in connection.execute(
+                sa.select([versions.c.version_id, versions.c.content, versions.c.delta])
+                .where(versions.c.id == dictionary_id)
+                .order_by(versions.c.version, versions.c.version_id)):
+            if delta is None:
+                value = content
+            else:
+                value = apply_delta(value or "", delta)
+                updates.append({"b_version_id": version_id, "b_content": value})
+
+        _update(connection, updates, delta=None, delta_depth=0)
+
+    op.drop_column('dictionaries_versions', 'delta_depth')
+    op.drop_column('dictionaries_versions', 'delta')
+
+
+def _dictionary_ids(connection):
+    return [row[0] for row in connection.execute(sa.select([versions.c.id]).distinct())]
+
+
+def _update(connection, updates, **values):
+    if not updates:
+        return
+
+    for key in updates[0]:
+        if key != "b_version_id":
+            values[key[2:]] = sa.bindparam(key)
+
+    connection.execute(
+        versions.update()
+        .where(versions.c.version_id == sa.bindparam("b_version_id"))
+        .values(**values),
+        updates,
+    )
+
+
+def encode_delta(source, target):
+    source_lines = source.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+
+    ops = []
+    matcher = difflib.SequenceMatcher(None, source_lines, target_lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(target_lines[j1:j2]))
+
+    return zlib.compress(json.dumps(ops).encode("utf-8"))
+
+
+def apply_delta(source, delta):
+    source_lines = source.splitlines(keepends=True)
+
+    parts = []
+    for op_ in json.loads(zlib.decompress(delta).decode("utf-8")):
+        if isinstance(op_, list):
+            parts.extend(source_lines[op_[0]:op_[1]])
+        else:
+            parts.append(op_)
+
+    return "".join(parts)
+
+
+def pack_version(previous, value, previous_depth, snapshot_interval):
+    if previous is None or value is None or \
+            previous_depth + 1 >= snapshot_interval:
+        return value, None, 0
+
+    delta = encode_delta(previous, value)
+    if len(delta) >= len(value.encode("utf-8")):
+        return value, None, 0
+
+    return None, delta, previous_depth + 1
@@ -0,0 +1,31 @@
+"""Add template usage statistics table
+
+Revision ID: 4a7c2e8f1b35
+Revises: e5a8f3c1d920
+Create Date: 2026-10-18 13:48:09.726115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '4a7c2e8f1b35'
+down_revision = 'e5a8f3c1d920'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('template_stats',
+    sa.Column('template_id', postgresql.UUID(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('hits', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('last_hit', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['template_id'], ['templates.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('template_id', 'day')
+    )
+
+
+def downgrade():
+    op.drop_table('template_stats')
@@ -0,0 +1,88 @@
+"""Add content size and hash to dictionary versions
+
+Revision ID: 8b2e6d0f5a13
+Revises: 3f9a1c2b7d44
+Create Date: 2026-10-18 11:03:17.204611
+
+"""
+import hashlib
+import json
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8b2e6d0f5a13'
+down_revision = '3f9a1c2b7d44'
+branch_labels = None
+depends_on = None
+
+
+versions = sa.table(
+    'dictionaries_versions',
+    sa.column('version_id'),
+    sa.column('id'),
+    sa.column('version'),
+    sa.column('content'),
+    sa.column('delta'),
+    sa.column('content_size'),
+    sa.column('content_hash'),
+)
+
+
+def upgrade():
+    op.add_column('dictionaries_versions', sa.Column('content_size', sa.BigInteger(), nullable=True))
+    op.add_column('dictionaries_versions', sa.Column('content_hash', sa.TEXT(), nullable=True))
+
+    # Заполнение для существующих версий, content версий-разниц
+    # восстанавливается по цепочке от полной копии
+    connection = op.get_bind()
+    dictionary_ids = [row[0] for row in connection.execute(sa.select([versions.c.id]).distinct())]
+    for dictionary_id in dictionary_ids:
+        updates = []
+        value = None
+        for version_id, content, delta in connection.execute(
+                sa.select([versions.c.version_id, versions.c.content, versions.c.delta])
+                .where(versions.c.id == dictionary_id)
+                .order_by(versions.c.version, versions.c.version_id)):
+            value = content if delta is None else apply_delta(value or "", delta)
+            size, hash = digest(value)
+            updates.append({"b_version_id": version_id, "b_content_size": size, "b_content_hash": hash})
+
+        if updates:
+            connection.execute(
+                versions.update()
+                .where(versions.c.version_id == sa.bindparam("b_version_id"))
+                .values(content_size=sa.bindparam("b_content_size"),
+                        content_hash=sa.bindparam("b_content_hash")),
+                updates,
+            )
+
+
+def downgrade():
+    op.drop_column('dictionaries_versions', 'content_hash')
+    op.drop_column('dictionaries_versions', 'content_size')
+
+
+# Копия формата версий на момент миграции, чтобы она не зависела от
+# изменений кода приложения (components_utils.version_history)
+def apply_delta(source, delta):
+    source_lines = source.splitlines(keepends=True)
+
+    parts = []
+    for op_ in json.loads(zlib.decompress(delta).decode("utf-8")):
+        if isinstance(op_, list):
+            parts.extend(source_lines[op_[0]:op_[1]])
+        else:
+            parts.append(op_)
+
+    return "".join(parts)
+
+
+def digest(value):
+    if value is None:
+        return None, None
+
+    data = value.encode("utf-8")
+    return len(data), hashlib.sha256(data).hexdigest()
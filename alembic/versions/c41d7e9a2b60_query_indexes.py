@@ -0,0 +1,55 @@
+"""Add indexes for component queries and trigram search
+
+Revision ID: c41d7e9a2b60
+Revises: 8b2e6d0f5a13
+Create Date: 2026-10-18 12:21:05.318442
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7e9a2b60'
+down_revision = '8b2e6d0f5a13'
+branch_labels = None
+depends_on = None
+
+
+# (name, table, columns, kwargs)
+INDEXES = (
+    ('suites_profile_id', 'suites', ['profile_id'], {}),
+    ('testcase_profile_id', 'testcase', ['profile_id'], {}),
+    ('access_profile_user_profile_id', 'access_profile_user', ['profile_id'], {}),
+    ('access_profile_account_profile_id', 'access_profile_account', ['profile_id'], {}),
+    ('dictionaries_versions_id_version', 'dictionaries_versions', ['id', 'version'], {}),
+    ('dictionaries_profile_ids', 'dictionaries', ['profile_ids'], {'postgresql_using': 'gin'}),
+)
+
+# (name, table, column)
+TRGM_INDEXES = (
+    ('templates_content_trgm', 'templates', 'content'),
+    ('dictionaries_title_trgm', 'dictionaries', 'title'),
+    ('suites_title_trgm', 'suites', 'title'),
+    ('profiles_name_trgm', 'profiles', 'name'),
+    ('complects_name_trgm', 'complects', 'name'),
+    ('testcase_title_trgm', 'testcase', 'title'),
+)
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    for name, table, columns, kwargs in INDEXES:
+        op.create_index(name, table, columns, unique=False, **kwargs)
+
+    for name, table, column in TRGM_INDEXES:
+        op.create_index(name, table, [column], unique=False, postgresql_using='gin',
+                        postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade():
+    for name, table, _ in reversed(TRGM_INDEXES):
+        op.drop_index(name, table_name=table)
+
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,35 @@
+"""Add full text search indexes
+
+Revision ID: e5a8f3c1d920
+Revises: c41d7e9a2b60
+Create Date: 2026-10-18 13:02:47.551093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e5a8f3c1d920'
+down_revision = 'c41d7e9a2b60'
+branch_labels = None
+depends_on = None
+
+
+# Выражения должны совпадать с nlab.db.to_tsvector. tsvector ограничен
+# 1 МБ, поэтому content словарей индексируется только для поиска подстроки
+def upgrade():
+    op.create_index('templates_content_fts', 'templates',
+                    [sa.text("to_tsvector('simple', content)")],
+                    unique=False, postgresql_using='gin')
+    op.create_index('dictionaries_title_fts', 'dictionaries',
+                    [sa.text("to_tsvector('simple', title)")],
+                    unique=False, postgresql_using='gin')
+    op.create_index('dictionaries_content_trgm', 'dictionaries', ['content'],
+                    unique=False, postgresql_using='gin',
+                    postgresql_ops={'content': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('dictionaries_content_trgm', table_name='dictionaries')
+    op.drop_index('dictionaries_title_fts', table_name='dictionaries')
+    op.drop_index('templates_content_fts', table_name='templates')
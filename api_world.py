@@ -19,7 +19,10 @@ from components.profile import ProfileRpc
 from components.suite import SuiteRpc
 from components.system import SystemRpc
 from components.template import TemplateRpc
+from components.task import TaskRpc
+from components.template_stats import TemplateStatsRpc
 from components.testcase import TestcaseRpc
+from models import dictionary_history
 
 
 # add all imported "rpc" classes here
@@ -28,13 +31,16 @@ RPC_CLASSES = (
     TestcaseRpc, AccessProfileUserRpc,
     AccessUserFlagsRpc, AccessProfileAccountRpc, CompilerRpc,
     ComplectRevisionRpc, DeployRpc, AccessComplectAccountRpc,
-    SystemRpc, ClusterRpc
+    SystemRpc, ClusterRpc, TemplateStatsRpc, TaskRpc
 )
 
 
 class ApiWorld:
     def __init__(self, create_session):
         self.create_session = create_session
+        # Версии словарей пишутся после flush сессий сервиса
+        dictionary_history.listen(create_session.sessionmaker)
+
         self.tracer = Tracer("proxy")
         self.tracer.configure({})
 
@@ -0,0 +1,50 @@
+""" Сравнение скорости преобразования текстов шаблонов.
+
+    Замеряет быстрый разбор разметки редактора (_transform_editor_markup)
+    и разбор BeautifulSoup (_transform_soup) на текстах из
+    test_processor.GOLDEN, которые принимает быстрый разбор, и на типичных
+    текстах шаблонов. Итоговый transform_template_text замеряется на
+    тех же текстах.
+
+    Запуск:
+
+        PYTHONPATH=. python benchmark_processor.py [number]
+"""
+import sys
+import timeit
+
+from processor import (_transform_editor_markup, _transform_soup,
+                       transform_template_text)
+from test_processor import GOLDEN
+
+SAMPLES = {
+    "plain": "Привет! Чем могу помочь? " * 20,
+    "editor": "<div>Привет!&nbsp;Чем могу помочь?</div><div><br></div>"
+              "<div>Ответ &quot;да&quot; или &lt;нет&gt;</div>" * 10,
+    "other": "<p>Привет! <b>Чем</b> могу помочь?</p>" * 10,
+}
+
+
+def _time(func, texts, number):
+    return timeit.timeit(lambda: [func(text) for text in texts],
+                         number=number)
+
+
+def benchmark(number=2000):
+    corpora = {
+        "golden": [text for text, _ in GOLDEN
+                   if _transform_editor_markup(text) is not None],
+    }
+    corpora.update((name, [text]) for name, text in SAMPLES.items())
+
+    for name, texts in corpora.items():
+        soup_time = _time(_transform_soup, texts, number)
+        fast_time = _time(_transform_editor_markup, texts, number)
+        transform_time = _time(transform_template_text, texts, number)
+        print("%-7s soup %.3fs  fast %.3fs  transform %.3fs  x%.1f"
+              % (name, soup_time, fast_time, transform_time,
+                 soup_time / transform_time))
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,131 @@
+""" Проверка использования индексов запросами компонентов gateway.
+
+    Вызывает читающие методы компонентов на базе из настроек окружения,
+    перехватывает выполненные SELECT запросы и для каждого выполняет
+    EXPLAIN с enable_seqscan = off. Если в плане есть последовательное
+    чтение таблицы с условием (Seq Scan с Filter), значит подходящего
+    индекса нет: запрос печатается и скрипт завершается с кодом 1.
+
+    Чтение таблицы без условий (list без фильтров) ошибкой не считается.
+
+    Запуск после alembic upgrade head:
+
+        PYTHONPATH=. python check_indexes.py
+"""
+import sys
+import uuid
+
+from sqlalchemy import event
+
+import settings
+from api_world import ApiWorld
+from components.access_complect_account import AccessComplectAccountRpc
+from components.access_profile_account import AccessProfileAccountRpc
+from components.access_profile_user import AccessProfileUserRpc
+from components.complect import ComplectRpc
+from components.dictionary import DictionaryRpc
+from components.profile import ProfileRpc
+from components.suite import SuiteRpc
+from components.template import TemplateRpc
+from components.testcase import TestcaseRpc
+from models import dictionary_history
+from nlab.db import create_sessionmaker
+from nlab.rpc import ApiError
+
+ID = str(uuid.uuid4())
+SEARCH = "check indexes"
+
+# (класс компонента, метод, параметры)
+CALLS = (
+    (TemplateRpc, "list", {"suite_id": ID}),
+    (TemplateRpc, "list", {"profile_ids": [ID]}),
+    (TemplateRpc, "list", {"search": SEARCH}),
+    (TemplateRpc, "list", {"suite_id": ID, "_with_stats": True}),
+    (TemplateRpc, "fetch", {"id": ID, "_with_stats": True}),
+    (TemplateRpc, "fetch", {"id": ID}),
+    (SuiteRpc, "list", {"profile_ids": [ID]}),
+    (SuiteRpc, "list", {"profile_ids": [ID], "search": SEARCH}),
+    (SuiteRpc, "fetch", {"id": ID}),
+    (DictionaryRpc, "list", {"profile_id": ID}),
+    (DictionaryRpc, "list", {"search": SEARCH}),
+    (DictionaryRpc, "list_versions", {"id": ID}),
+    (DictionaryRpc, "fetch", {"id": ID}),
+    (TestcaseRpc, "list", {"profile_ids": [ID]}),
+    (ProfileRpc, "list", {"user": {"user_id": ID}}),
+    (ProfileRpc, "list", {"search": SEARCH}),
+    (ProfileRpc, "fetch", {"id": ID}),
+    (ComplectRpc, "list_", {"search": SEARCH}),
+    (ComplectRpc, "fetch", {"id": ID}),
+    (AccessProfileUserRpc, "list", {"user_id": ID}),
+    (AccessProfileAccountRpc, "list", {"account_id": ID}),
+    (AccessComplectAccountRpc, "list_", {"account_id": ID}),
+)
+
+
+def seq_scans(plan):
+    """
+    Таблицы, которые читаются последовательно с условием
+    """
+    if plan["Node Type"] == "Seq Scan" and "Filter" in plan:
+        yield plan["Relation Name"]
+
+    for child in plan.get("Plans", []):
+        yield from seq_scans(child)
+
+
+def collect_queries(api, engine):
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            queries.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        for rpc_class, method, kwargs in CALLS:
+            try:
+                getattr(api.rpcs[rpc_class], method)(**kwargs)
+            except ApiError:
+                # NOT_EXISTS и т. п.: запрос всё равно выполнен
+                pass
+
+        with engine.connect() as connection:
+            dictionary_history.contents(connection, ID, [1])
+            dictionary_history._latest(connection, [ID])
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return queries
+
+
+def main():
+    sessionmaker = create_sessionmaker(env_prefix=settings.POSTGRES_ENV_PREFIX)
+    engine = sessionmaker().session.bind
+    api = ApiWorld(sessionmaker)
+
+    queries = collect_queries(api, engine)
+
+    failed = 0
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SET enable_seqscan = off")
+        for statement, parameters in queries:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+            plan = cursor.fetchone()[0][0]["Plan"]
+
+            tables = sorted(set(seq_scans(plan)))
+            if tables:
+                failed += 1
+                print(f"Seq Scan on {', '.join(tables)}:\n{statement}\n")
+    finally:
+        connection.rollback()
+        connection.close()
+
+    print(f"Checked {len(queries)} queries, {failed} without index")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
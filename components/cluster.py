@@ -1,10 +1,12 @@
 import logging
 
+import settings
+from components_utils.processor_client import processor
 from models import Complect
-from nlab.job.job import post_request, get_info_request
-from nlab.rpc import RpcGroup
+from nlab.cache import TtlCache
+from nlab.job import get_info_request
+from nlab.rpc import EXECUTOR_PROCESSOR, RpcGroup, rpc_executor
 from nlab.rpc.exceptions import ApiError
-from settings import PROCESSOR_HOST, HEADERS
 
 logger = logging.getLogger(__name__)
 
@@ -16,16 +18,32 @@ class ClusterRpc(RpcGroup):
         super().__init__(
             name="cluster", tracer=tracer, create_session=create_session
         )
+        self._compilers = TtlCache(
+            self._load_compilers,
+            ttl=settings.CLUSTER_COMPILERS_TTL,
+            stale_ttl=settings.CLUSTER_COMPILERS_STALE_TTL,
+            name="compilers",
+        )
 
+    @rpc_executor(EXECUTOR_PROCESSOR)
     def complect_info(self, complect_id):
         """Информация о комплекте"""
         return self._get_complect_info(complect_id)
 
+    def invalidate_compilers(self):
+        """
+        Сброс кэша списка компиляторов, следующий запрос загрузит список
+        с процессора
+        """
+        self._compilers.invalidate()
+        return {}
+
     def _get_compilers(self):
-        response = post_request(
-            url=PROCESSOR_HOST,
-            headers=HEADERS,
-            request_data=get_info_request(
+        return self._compilers.get()
+
+    def _load_compilers(self, _key):
+        response = processor.call(
+            get_info_request(
                 method="cluster.list_compilers",
             )
         )
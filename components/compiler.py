@@ -1,10 +1,10 @@
 from sqlalchemy.orm import load_only
 
+from components_utils.processor_client import processor
 from models import Complect
-from nlab.job import get_create_request, get_info_request, post_request
-from nlab.rpc import RpcGroup, rpc_name
+from nlab.job import get_create_request, get_info_request
+from nlab.rpc import EXECUTOR_PROCESSOR, RpcGroup, rpc_executor, rpc_name
 from nlab.rpc.exceptions import ApiError
-from settings import HEADERS, PROCESSOR_HOST
 
 
 class CompilerRpc(RpcGroup):
@@ -15,6 +15,7 @@ class CompilerRpc(RpcGroup):
             name="compiler", tracer=tracer, create_session=create_session
         )
 
+    @rpc_executor(EXECUTOR_PROCESSOR)
     def create(self, complect_id, try_create_revision=False):
         """
         Создание задачи
@@ -35,10 +36,8 @@ class CompilerRpc(RpcGroup):
                 message="Can't find complect with id=%r" % complect_id
             )
 
-        response = post_request(
-            url=PROCESSOR_HOST,
-            headers=HEADERS,
-            request_data=get_create_request(
+        response = processor.call(
+            get_create_request(
                 method="task.create",
                 script="scripts.processor.run",
                 type="compiler",
@@ -58,13 +57,13 @@ class CompilerRpc(RpcGroup):
         raise ApiError(code="UNHANDLED", message=result["errors"]["message"])
 
     @staticmethod
+    @rpc_executor(EXECUTOR_PROCESSOR)
     def info(task_id):
         """
         Получение информации о задаче
         """
-        result = post_request(
-            url=PROCESSOR_HOST, headers=HEADERS,
-            request_data=get_info_request(method="task.info", task_id=task_id)
+        result = processor.call(
+            get_info_request(method="task.info", task_id=task_id)
         )
 
         result = result["result"]
@@ -74,15 +73,15 @@ class CompilerRpc(RpcGroup):
         raise ApiError(code="NOT_EXISTS", message=result["errors"]["message"])
 
     @staticmethod
+    @rpc_executor(EXECUTOR_PROCESSOR)
     @rpc_name("list")
     def list_(extra=None, offset=None, limit=None, order=None):
         """
         Получение списка задач по типу
         """
 
-        result = post_request(
-            url=PROCESSOR_HOST, headers=HEADERS,
-            request_data=get_info_request(
+        result = processor.call(
+            get_info_request(
                 method="task.list", type="compiler",
                 extra=extra,
                 offset=offset, limit=limit, order=order
@@ -2,6 +2,7 @@ import copy
 from datetime import datetime
 
 from components_utils.batch_operations import BatchUpdateMixin
+from components_utils.search import Search
 from models import Complect
 from nlab.rpc import ApiError, RpcGroup, rpc_name
 from nlab.rpc.object import VersionNoObject, VersionObject
@@ -18,6 +19,7 @@ class ComplectRpc(RpcGroup, BatchUpdateMixin):
             name=self.name, primary_key="complect_id", entity=Complect,
             create_session=create_session
         )
+        self.complect_search = Search(trgm_columns=(Complect.name,))
 
     def create(self, **kwargs):
         with self.create_session() as session:
@@ -29,32 +31,48 @@ class ComplectRpc(RpcGroup, BatchUpdateMixin):
 
     @rpc_name("list")
     def list_(self, user=None, account_id=None, offset=None, limit=None,
-              search=None, order=None):
+              search=None, order=None, cursor=None, total=None,
+              fields=None):
 
-        filter_q = {}
+        filter_q = []
         join = None
 
-        items, total_items = self.complect.filter(
+        fetch_args, form_items = None, None
+        found = self.complect_search.query(search)
+        if found:
+            filter_q.append(found.filter)
+            fetch_args = found.fetch_args
+            form_items = found.form_items(lambda items: [
+                self.complect.project(item[0].to_dict(), fields)
+                for item in items
+            ])
+
+        page = self.complect.filter_page(
             filter_q=filter_q, join=join,
-            offset=offset, limit=limit, order=order
+            offset=offset, limit=limit, order=order, cursor=cursor,
+            total=total, fields=fields, fetch_args=fetch_args,
+            form_items=form_items
         )
 
         return {
-            "items": items,
-            "total": total_items,
+            "items": page.items,
+            "total": page.total,
+            "next_cursor": page.next_cursor,
+            "has_more": page.has_more,
         }
 
-    def fetch(self, id):
+    def fetch(self, id, fields=None):
 
         with self.create_session() as session:
-            complect_model = self.complect.get(id, session=session)
+            complect_model = self.complect.get(id, session=session,
+                                               fields=fields)
             if not complect_model:
                 raise ApiError(
                     code="NOT_EXISTS",
                     message="Can't find complect with id=%r" % id
                 )
 
-            return complect_model.to_dict()
+            return self.complect.project(complect_model.to_dict(), fields)
 
     def change(self, id, action, profile_id):
 
@@ -91,6 +109,29 @@ class ComplectRpc(RpcGroup, BatchUpdateMixin):
 
             return complect_model.to_dict()
 
+    def _bulk_object(self):
+        return self.complect
+
+    def _bulk_update_values(self, name=None, state=None, profile_ids=None,
+                            meta=None, is_enabled=None, code=None,
+                            compiler_target=None, debug_target=None,
+                            deploy_target=None):
+        values = {
+            "name": name,
+            "state": state,
+            "profile_ids": profile_ids,
+            "meta": meta,
+            "is_enabled": is_enabled,
+            "code": code,
+            "compiler_target": compiler_target,
+            "debug_target": debug_target,
+            "deploy_target": deploy_target,
+        }
+
+        return {
+            key: value for key, value in values.items() if value is not None
+        }
+
     def remove(self, id):
 
         try:
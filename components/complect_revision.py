@@ -1,7 +1,7 @@
-from nlab.job import get_info_request, post_request
-from nlab.rpc import RpcGroup, rpc_name
+from components_utils.processor_client import processor
+from nlab.job import get_info_request
+from nlab.rpc import EXECUTOR_PROCESSOR, RpcGroup, rpc_executor, rpc_name
 from nlab.rpc.exceptions import ApiError
-from settings import HEADERS, PROCESSOR_HOST
 
 
 class ComplectRevisionRpc(RpcGroup):
@@ -13,6 +13,7 @@ class ComplectRevisionRpc(RpcGroup):
             create_session=create_session
         )
 
+    @rpc_executor(EXECUTOR_PROCESSOR)
     @rpc_name("list")
     def list_of_complect_revisions(self, complect_id=None,
                                    offset=None, limit=None, order=None):
@@ -32,9 +33,8 @@ class ComplectRevisionRpc(RpcGroup):
 
     def _get_complect_revision_list(self, *, complect_id, offset, limit,
                                     order):
-        result = post_request(
-            url=PROCESSOR_HOST, headers=HEADERS,
-            request_data=get_info_request(
+        result = processor.call(
+            get_info_request(
                 method="complect_revision.list",
                 complect_id=complect_id,
                 offset=offset, limit=limit, order=order
@@ -1,8 +1,8 @@
+from components_utils.processor_client import processor
 from models import Complect
-from nlab.rpc import RpcGroup, rpc_name
+from nlab.rpc import EXECUTOR_PROCESSOR, RpcGroup, rpc_executor, rpc_name
 from nlab.rpc.exceptions import ApiError
-from nlab.job import get_create_request, post_request, get_info_request
-from settings import HEADERS, PROCESSOR_HOST
+from nlab.job import get_create_request, get_info_request
 
 
 class DeployRpc(RpcGroup):
@@ -14,6 +14,7 @@ class DeployRpc(RpcGroup):
             name="deploy", tracer=tracer, create_session=create_session
         )
 
+    @rpc_executor(EXECUTOR_PROCESSOR)
     def run(self, complect_revision_id):
         """
         Run deploy process
@@ -29,10 +30,8 @@ class DeployRpc(RpcGroup):
             )
 
         # Query complect revision information, we need Complect deploy_target
-        complect_revision_response = post_request(
-            url=PROCESSOR_HOST,
-            headers=HEADERS,
-            request_data=get_info_request(
+        complect_revision_response = processor.call(
+            get_info_request(
                 method="complect_revision.fetch",
                 id=complect_revision_id,
             )
@@ -52,10 +51,8 @@ class DeployRpc(RpcGroup):
             complect_model = session.query(Complect).get(complect_id)
             deploy_target = complect_model.deploy_target
 
-        response = post_request(
-            url=PROCESSOR_HOST,
-            headers=HEADERS,
-            request_data=get_create_request(
+        response = processor.call(
+            get_create_request(
                 method="task.create",
                 script="scripts.deploy.run",
                 type=self.TASK_TYPE,
@@ -76,13 +73,13 @@ class DeployRpc(RpcGroup):
         return result["response"]
 
     @staticmethod
+    @rpc_executor(EXECUTOR_PROCESSOR)
     def info(task_id):
         """
         Get task info
         """
-        result = post_request(
-            url=PROCESSOR_HOST, headers=HEADERS,
-            request_data=get_info_request(method="task.info", task_id=task_id)
+        result = processor.call(
+            get_info_request(method="task.info", task_id=task_id)
         )
 
         result = result["result"]
@@ -92,14 +89,14 @@ class DeployRpc(RpcGroup):
         raise ApiError(code="NOT_EXISTS", message=result["errors"]["message"])
 
     @classmethod
+    @rpc_executor(EXECUTOR_PROCESSOR)
     @rpc_name("list")
     def list_(cls, extra=None, offset=None, limit=None, order=None):
         """
         Get deploy task's list
         """
-        result = post_request(
-            url=PROCESSOR_HOST, headers=HEADERS,
-            request_data=get_info_request(
+        result = processor.call(
+            get_info_request(
                 method="task.list", type=cls.TASK_TYPE,
                 extra=extra,
                 offset=offset, limit=limit, order=order
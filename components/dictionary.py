@@ -1,17 +1,26 @@
+from collections import defaultdict
 from datetime import datetime
 
-from components_utils.batch_operations import BatchUpdateMixin
-from models import Dictionary, DictionaryVersion
-from nlab.job import get_create_request, post_request
-from nlab.rpc import ApiError, RpcGroup
+from sqlalchemy.orm import load_only
+
+from components_utils.batch_operations import (BatchUpdateMixin,
+                                               BulkCreateMixin)
+from components_utils.processor_client import processor
+from components_utils.search import Search
+from components_utils.transform_cache import transform_text
+from components_utils.version_history import BrokenVersionChain
+from models import Dictionary, DictionaryVersion, dictionary_history
+from nlab.job import get_create_request
+from nlab.rpc import EXECUTOR_PROCESSOR, ApiError, RpcGroup, rpc_executor
 from nlab.rpc.object import VersionNoObject, VersionObject
-from processor import transform_template_text
-from settings import PROCESSOR_HOST
 
 TYPE = "dictionary"
 
 
-class DictionaryRpc(RpcGroup, BatchUpdateMixin):
+class DictionaryRpc(RpcGroup, BatchUpdateMixin, BulkCreateMixin):
+    # Номер версии словаря меняется только вместе с записью в истории
+    _bulk_skip_unchanged = True
+
     def __init__(self, tracer, create_session):
 
         super().__init__(name="dictionary", tracer=tracer,
@@ -21,6 +30,14 @@ class DictionaryRpc(RpcGroup, BatchUpdateMixin):
             entity=Dictionary, versions_entity=DictionaryVersion,
             create_session=create_session,
         )
+        # Полнотекстовый поиск по code (колонка title), поиск подстроки
+        # по code и content: content может не уместиться в tsvector.
+        # Фрагменты строятся по code, с которым сопоставляется tsquery
+        self.dictionary_search = Search(
+            fts_columns=(Dictionary.code,),
+            trgm_columns=(Dictionary.code, Dictionary.content),
+            snippet_column=Dictionary.code,
+        )
 
     def create(self, code=None, description=None, content=None, common=None,
                state=None, meta=None, profile_ids=None, is_enabled=None,
@@ -37,9 +54,55 @@ class DictionaryRpc(RpcGroup, BatchUpdateMixin):
             session.commit()
             return result
 
+    def _bulk_object(self):
+        return self.dictionary
+
+    def _bulk_row(self, **kwargs):
+        row = {
+            "created": datetime.now(),
+            "version": 1,
+        }
+        row.update(self._bulk_update_values(**kwargs))
+
+        return row
+
+    def _bulk_update_values(self, code=None, description=None, content=None,
+                            common=None, state=None, meta=None,
+                            profile_ids=None, is_enabled=None, hidden=None,
+                            kind=None, parts=None):
+        values = {
+            "title": code,
+            "description": description,
+            "content": content,
+            "common": common,
+            "kind": kind,
+            "state": state,
+            "meta": meta,
+            "profile_ids": profile_ids,
+            "is_enabled": is_enabled,
+            "hidden": hidden,
+            "parts": parts,
+        }
+
+        return {
+            key: value for key, value in values.items() if value is not None
+        }
+
+    def _bulk_after_insert(self, ids, rows, *, session):
+        self._write_versions(ids, session=session)
+
+    def _bulk_after_update(self, ids, *, session):
+        self._write_versions(ids, session=session)
+
+    @staticmethod
+    def _write_versions(ids, *, session):
+        # Пишутся в обход ORM, поэтому обработчик flush их не видит
+        dictionary_history.write(session.connection(), ids)
+
     def list(self, profile_id=None, offset=None, limit=None, search=None,
              common=None, order=None, code=None, id=None, kind=None,
-             _with_content=None, _process=None):
+             _with_content=None, _process=None, _stream=None, cursor=None,
+             total=None, fields=None):
 
         filter_q = []
 
@@ -60,43 +123,149 @@ class DictionaryRpc(RpcGroup, BatchUpdateMixin):
         if common is not None:
             filter_q.append(Dictionary.common == common)
 
-        form_items = lambda items: [  # noqa
-            item[0].to_dict() if _with_content else item[0].to_short_dict()
-            for item in items
-        ]
-
-        items, total_items = self.dictionary.filter(filter_q=filter_q,
-                                                    offset=offset,
-                                                    limit=limit,
-                                                    form_items=form_items,
-                                                    order=order)
+        if fields is None and not _with_content:
+            # Без _with_content колонка content не читается из базы
+            fields = Dictionary.SHORT_FIELDS
+
+        fetch_args, form_items = None, None
+        found = self.dictionary_search.query(search)
+        if found:
+            filter_q.append(found.filter)
+            fetch_args = found.fetch_args
+            form_items = found.form_items(lambda items: [
+                self.dictionary.project(item[0].to_dict(), fields)
+                for item in items
+            ])
+
+        if _stream:
+            items = self.dictionary.stream(filter_q=filter_q, offset=offset,
+                                           limit=limit, fields=fields,
+                                           order=order, fetch_args=fetch_args,
+                                           form_items=form_items,
+                                           cursor=cursor, total=total)
+            if _process:
+                items.map(_process_dictionary_inplace)
+
+            return {
+                "items": items,
+                "total": items.total,
+                "next_cursor": items.next_cursor,
+                "has_more": items.has_more,
+            }
+
+        page = self.dictionary.filter_page(
+            filter_q=filter_q, offset=offset, limit=limit,
+            fields=fields, order=order, cursor=cursor, total=total,
+            fetch_args=fetch_args, form_items=form_items
+        )
 
+        items = page.items
         if _process:
             items = [_process_dictionary_inplace(item) for item in items]
 
         return {
             "items": items,
-            "total": total_items,
+            "total": page.total,
+            "next_cursor": page.next_cursor,
+            "has_more": page.has_more,
         }
 
-    def list_versions(self, id, order=None, offset=None, limit=None):
-        items, total_items = self.dictionary.versions(
-            id, order=order, offset=offset, limit=limit,
-        )
+    def list_versions(self, id, order=None, offset=None, limit=None,
+                      total=None, _with_content=None):
+        """
+        Список версий словаря. По умолчанию без content: из базы читаются
+        только поля метаданных, включая content_size и content_hash.
+        content версии можно получить через fetch_version.
+        """
+        if _with_content:
+            page = self.dictionary.versions_page(
+                id, order=order, offset=offset, limit=limit, total=total,
+            )
+
+            with self.create_session() as session:
+                self._restore_contents(page.items, session=session)
+        else:
+            page = self.dictionary.versions_page(
+                id, order=order, offset=offset, limit=limit, total=total,
+                options=[load_only(*DictionaryVersion.META_FIELDS)],
+                form_items=lambda items: [
+                    item[0].to_meta_dict() for item in items
+                ],
+            )
 
         return {
-            "items": items,
-            "total": total_items,
+            "items": page.items,
+            "total": page.total,
+            "has_more": page.has_more,
         }
 
-    def fetch(self, id, _process=None):
+    def fetch_version(self, id, version=None, version_id=None,
+                      _process=None):
+        """
+        Получение версии словаря с восстановленным content.
+        Версия задаётся номером version или идентификатором version_id.
+        """
+        if (version is None) == (version_id is None):
+            raise ApiError(
+                code="INVALID_PARAMS",
+                message="Exactly one of `version` and `version_id` "
+                        "must be given"
+            )
+
+        with self.create_session() as session:
+            filter_by_q = {"dictionary_id": id}
+            if version_id is not None:
+                filter_by_q["version_id"] = version_id
+            else:
+                filter_by_q["version"] = version
+
+            version_model = session.query(DictionaryVersion).filter_by(
+                **filter_by_q
+            ).first()
+            if not version_model:
+                raise ApiError(
+                    code="NOT_EXISTS",
+                    message="Can't find version %r of dictionary with "
+                            "id=%r" % (version_id or version, id)
+                )
+
+            item = version_model.to_dict()
+            self._restore_contents([item], session=session)
+
+        if _process:
+            item = _process_dictionary_inplace(item)
+
+        return item
+
+    @staticmethod
+    def _restore_contents(items, *, session):
+        # Версии, хранящиеся разницей, восстанавливаются от ближайшей
+        # полной копии, по одному запросу на словарь
+        missing = defaultdict(set)
+        for item in items:
+            if item["content"] is None:
+                missing[item["id"]].add(item["version"])
+
+        for id, versions in missing.items():
+            try:
+                contents = dictionary_history.contents(
+                    session.connection(), id, versions
+                )
+            except BrokenVersionChain as e:
+                raise ApiError(code="BROKEN_HISTORY", message=str(e)) from e
+            for item in items:
+                if item["id"] == id and item["content"] is None:
+                    item["content"] = contents.get(item["version"])
+
+    def fetch(self, id, _process=None, fields=None):
 
         with self.create_session() as session:
-            profile_model = self.dictionary.get(id, session=session)
+            profile_model = self.dictionary.get(id, session=session,
+                                                fields=fields)
             if not profile_model:
                 raise ApiError(code="NOT_EXISTS",
                                message="Can't find profile with id=%r" % id)
-            item = profile_model.to_dict()
+            item = self.dictionary.project(profile_model.to_dict(), fields)
 
             if _process:
                 item = _process_dictionary_inplace(item)
@@ -162,7 +331,10 @@ class DictionaryRpc(RpcGroup, BatchUpdateMixin):
         if parts is not None:
             dictionary_model.parts = parts
 
-        dictionary_model.version += 1
+        # Без изменений версия в историю не пишется, поэтому и номер
+        # версии не меняется, иначе в истории были бы пропуски
+        if action != 'update' or dictionary_history.changed(dictionary_model):
+            dictionary_model.version += 1
 
         session.add(dictionary_model)
         session.flush()
@@ -172,14 +344,13 @@ class DictionaryRpc(RpcGroup, BatchUpdateMixin):
         return data
 
     @staticmethod
+    @rpc_executor(EXECUTOR_PROCESSOR)
     def import_file(profile_ids, file_name, data):
         """
         Импортирование словарей из файла
         """
-        result = post_request(
-            url=PROCESSOR_HOST,
-            headers=None,
-            request_data=get_create_request(
+        result = processor.call(
+            get_create_request(
                 method="task.create",
                 script="scripts.dictionary.import_run",
                 type=TYPE,
@@ -197,6 +368,7 @@ class DictionaryRpc(RpcGroup, BatchUpdateMixin):
 
         raise ApiError(code="UNHANDLED", message=result["errors"]["message"])
 
+    @rpc_executor(EXECUTOR_PROCESSOR)
     def export(self, ids):
         """
         Экспортирование шаблонов
@@ -211,10 +383,8 @@ class DictionaryRpc(RpcGroup, BatchUpdateMixin):
             dictionaries[dict_id]["name"] = suite["code"] or suite.dictionary_id  # noqa
             dictionaries[dict_id]["content"] = suite["content"]
 
-        result = post_request(
-            url=PROCESSOR_HOST,
-            headers=None,
-            request_data=get_create_request(
+        result = processor.call(
+            get_create_request(
                 method="task.create",
                 script="scripts.dictionaries.export_run",
                 type=TYPE,
@@ -235,5 +405,5 @@ def _process_dictionary_inplace(dictionary):
     if "content" not in dictionary:
         return dictionary
 
-    dictionary["content"] = transform_template_text(dictionary["content"])
+    dictionary["content"] = transform_text(dictionary["content"])
     return dictionary
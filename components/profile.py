@@ -6,6 +6,7 @@ from sqlalchemy import and_
 
 import settings
 from components_utils.batch_operations import BatchUpdateMixin
+from components_utils.search import Search
 from models import (AccessProfileAccount, AccessProfileUser, AccessUserFlags,
                     Complect, Profile, Suite)
 from nlab.db import next_seq_id
@@ -24,6 +25,7 @@ class ProfileRpc(RpcGroup, BatchUpdateMixin):
             name=self.name, primary_key="profile_id", entity=Profile,
             create_session=create_session
         )
+        self.profile_search = Search(trgm_columns=(Profile.name,))
 
     def create(self, **kwargs):
 
@@ -35,14 +37,14 @@ class ProfileRpc(RpcGroup, BatchUpdateMixin):
             return result
 
     @staticmethod
-    def _form_items(default_perm_value):
+    def _form_items(default_perm_value, fields=None):
 
         def inner(items, value=default_perm_value):
 
             res = []
 
             for item, _, *permissions in items:
-                d = item.to_dict()
+                d = VersionObject.project(item.to_dict(), fields)
                 if permissions != [None] and permissions != []:
                     d["permissions"] = permissions[0]
                     if "dl_read" not in d["permissions"] or not d["permissions"]["dl_read"]:  # noqa
@@ -71,7 +73,8 @@ class ProfileRpc(RpcGroup, BatchUpdateMixin):
 
     def list(self, offset=None, limit=None, search=None, user=None,
              account_id=None, group_ids=None, role_id=None,
-             full_list=None, order=None):
+             full_list=None, order=None, cursor=None, total=None,
+             fields=None):
 
         filter_q = []
         outerjoin = None
@@ -143,31 +146,44 @@ class ProfileRpc(RpcGroup, BatchUpdateMixin):
 
                     filter_q.append(Profile.profile_id.in_(profile_ids))
 
-        items, total_items = self.profile.filter(
+        form_items = self._form_items(default_perm_value, fields)
+        found = self.profile_search.query(search)
+        if found:
+            filter_q.append(found.filter)
+            fetch_args = (fetch_args or []) + found.fetch_args
+            form_items = found.form_items(form_items)
+
+        page = self.profile.filter_page(
             filter_q=filter_q,
             offset=offset,
             limit=limit,
             outerjoin=outerjoin,
             fetch_args=fetch_args,
-            form_items=self._form_items(default_perm_value),
-            order=order
+            form_items=form_items,
+            order=order,
+            cursor=cursor,
+            total=total,
+            fields=fields
         )
 
         return {
-            "items": items,
-            "total": total_items,
+            "items": page.items,
+            "total": page.total,
+            "next_cursor": page.next_cursor,
+            "has_more": page.has_more,
         }
 
-    def fetch(self, id):
+    def fetch(self, id, fields=None):
 
         with self.create_session() as session:
-            profile_model = self.profile.get(id, session=session)
+            profile_model = self.profile.get(id, session=session,
+                                             fields=fields)
             if not profile_model:
                 raise ApiError(
                     code="NOT_EXISTS",
                     message="Can't find profile with id=%r" % id
                 )
-            return profile_model.to_dict()
+            return self.profile.project(profile_model.to_dict(), fields)
 
     def remove(self, id):
 
@@ -192,6 +208,11 @@ class ProfileRpc(RpcGroup, BatchUpdateMixin):
 
             return self.profile.remove(id, session=session)
 
+    def _bulk_object(self):
+        # Обновление профиля меняет и основной комплект, поэтому элементы
+        # списка обновляются через _store
+        return self.profile
+
     def store(self, **kwargs):
 
         with self.create_session() as session:
@@ -2,20 +2,22 @@ from datetime import datetime
 
 from sqlalchemy import func
 
-from components_utils.batch_operations import BatchUpdateMixin
+from components_utils.batch_operations import (BatchUpdateMixin,
+                                               BulkCreateMixin)
+from components_utils.processor_client import processor
+from components_utils.search import Search
 from models import Suite, Template
-from nlab.job import get_create_request, post_request
-from nlab.rpc import RpcGroup
+from nlab.job import get_create_request
+from nlab.rpc import EXECUTOR_PROCESSOR, RpcGroup, rpc_executor
 from nlab.rpc.exceptions import ApiError
 from nlab.rpc.object import VersionNoObject, VersionObject
-from settings import PROCESSOR_HOST
 
 from .template import TemplateRpc
 
 TYPE = "suite"
 
 
-class SuiteRpc(RpcGroup, BatchUpdateMixin):
+class SuiteRpc(RpcGroup, BatchUpdateMixin, BulkCreateMixin):
     def __init__(self, tracer, create_session):
 
         super().__init__(
@@ -25,6 +27,7 @@ class SuiteRpc(RpcGroup, BatchUpdateMixin):
             name=self.name, primary_key="suite_id", entity=Suite,
             create_session=create_session
         )
+        self.suite_search = Search(trgm_columns=(Suite.title,))
 
     def create(self, **kwargs):
         with self.create_session() as session:
@@ -34,6 +37,42 @@ class SuiteRpc(RpcGroup, BatchUpdateMixin):
 
         return result
 
+    def _bulk_object(self):
+        return self.suite
+
+    def _bulk_row(self, title=None, state=None, profile_id=None, meta=None,
+                  is_enabled=None):
+        if not profile_id:
+            raise ApiError(
+                code="MISSING_PROFILE_ID",
+                message="profile_id must be given for creating suite"
+            )
+
+        row = {
+            "profile_id": profile_id,
+            "created": datetime.now(),
+            "version": 1,
+        }
+        row.update(self._bulk_update_values(
+            title=title, state=state, meta=meta, is_enabled=is_enabled
+        ))
+
+        return row
+
+    def _bulk_update_values(self, title=None, state=None, profile_id=None,
+                            meta=None, is_enabled=None):
+        # profile_id при обновлении не меняется, как и в _store
+        values = {
+            "title": title,
+            "state": state,
+            "meta": meta,
+            "is_enabled": is_enabled,
+        }
+
+        return {
+            key: value for key, value in values.items() if value is not None
+        }
+
     def remove(self, id):
 
         try:
@@ -53,7 +92,8 @@ class SuiteRpc(RpcGroup, BatchUpdateMixin):
             raise ApiError(code="NOT_EXISTS", message=e.args[0]) from e
 
     def list(self, profile_ids, offset=None, limit=None, search=None,
-             order=None, is_enabled=None):
+             order=None, is_enabled=None, cursor=None, total=None,
+             fields=None):
 
         if not isinstance(profile_ids, list):
             profile_ids = [profile_ids]
@@ -63,10 +103,12 @@ class SuiteRpc(RpcGroup, BatchUpdateMixin):
         ]
         return self._stat_filter(
             filter_q=filter_q, offset=offset, limit=limit,
-            order=order, is_enabled=is_enabled
+            order=order, is_enabled=is_enabled, cursor=cursor, total=total,
+            fields=fields, search=search
         )
 
-    def _stat_filter(self, filter_q, offset, limit, order, is_enabled):
+    def _stat_filter(self, filter_q, offset, limit, order, is_enabled,
+                     cursor=None, total=None, fields=None, search=None):
 
         with self.create_session() as session:
             fetch_args = [
@@ -76,6 +118,11 @@ class SuiteRpc(RpcGroup, BatchUpdateMixin):
             if is_enabled is not None:
                 filter_q.append(Suite.is_enabled.is_(is_enabled))
 
+            found = self.suite_search.query(search)
+            if found:
+                filter_q.append(found.filter)
+                fetch_args.extend(found.fetch_args)
+
             q = self.suite.prepare_filter_q(
                 session=session,
                 filter_q=filter_q,
@@ -85,24 +132,35 @@ class SuiteRpc(RpcGroup, BatchUpdateMixin):
                 outerjoin=[Template],
                 group_by=[Suite.suite_id],
                 order=order,
+                cursor=cursor,
+                total=total,
+                fields=fields,
             )
 
-            items = q.all()
-            total_items = 0
-            if items:
-                total_items = items[0][1]
-
-            result_items = []
-            for item, total_count, templates_count in items:
-                res = item.to_dict()
-                res["stat"] = {
-                    "templates": templates_count,
-                }
-                result_items.append(res)
+            def form_items(items):
+                result_items = []
+                for item, total_count, templates_count in items:
+                    res = self.suite.project(item.to_dict(), fields)
+                    res["stat"] = {
+                        "templates": templates_count,
+                    }
+                    result_items.append(res)
+                return result_items
+
+            if found:
+                form_items = found.form_items(form_items)
+
+            page = self.suite.fetch_page(
+                q, session=session, offset=offset, limit=limit, order=order,
+                cursor=cursor, total=total, form_items=form_items,
+                fields=fields
+            )
 
             return {
-                "items": result_items,
-                "total": total_items,
+                "items": page.items,
+                "total": page.total,
+                "next_cursor": page.next_cursor,
+                "has_more": page.has_more,
             }
 
     def store(self, **kwargs):
@@ -156,25 +214,25 @@ class SuiteRpc(RpcGroup, BatchUpdateMixin):
 
         return suite_model.to_dict()
 
-    def fetch(self, id):
+    def fetch(self, id, fields=None):
 
         with self.create_session() as session:
-            suite_model = self.suite.get(id, session=session)
+            suite_model = self.suite.get(id, session=session, fields=fields)
             if not suite_model:
                 raise ApiError(
                     code="NOT_EXISTS",
                     message="Can't find suite with id=%r" % id
                 )
-            return suite_model.to_dict()
+            return self.suite.project(suite_model.to_dict(), fields)
 
     @staticmethod
+    @rpc_executor(EXECUTOR_PROCESSOR)
     def import_file(profile_id, file_name, data):
         """
         Импортирование шаблонов из файла
         """
-        result = post_request(
-            url=PROCESSOR_HOST, headers=None,
-            request_data=get_create_request(
+        result = processor.call(
+            get_create_request(
                 method="task.create",
                 script="scripts.suite.import_run",
                 type=TYPE,
@@ -191,6 +249,7 @@ class SuiteRpc(RpcGroup, BatchUpdateMixin):
 
         raise ApiError(code="UNHANDLED", message=result["errors"]["message"])
 
+    @rpc_executor(EXECUTOR_PROCESSOR)
     def export(self, ids):
         """
         Экспортирование шаблонов
@@ -213,9 +272,8 @@ class SuiteRpc(RpcGroup, BatchUpdateMixin):
             for template in templates["items"]:
                 suites[suite_id]["templates"].append(template["content"])
 
-        result = post_request(
-            url=PROCESSOR_HOST, headers=None,
-            request_data=get_create_request(
+        result = processor.call(
+            get_create_request(
                 method="task.create",
                 script="scripts.suite.export_run",
                 type=TYPE,
@@ -1,3 +1,5 @@
+from components_utils.processor_client import processor, task_watcher
+from components_utils.transform_cache import transform_text
 from nlab.rpc import RpcGroup
 
 
@@ -14,3 +16,14 @@ class SystemRpc(RpcGroup):
                 "gateway": "1.0.3",
             },
         }
+
+    def metrics(self):
+        """
+        Время ответа процессора по методам, число опрашиваемых задач и
+        состояние кэша преобразования текстов
+        """
+        return {
+            "processor": processor.metrics(),
+            "task_watcher": task_watcher.status(),
+            "transform_cache": transform_text.status(),
+        }
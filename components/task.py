@@ -0,0 +1,51 @@
+import settings
+from components_utils.processor_client import task_watcher
+from nlab.rpc import EXECUTOR_WATCH, RpcGroup, rpc_executor
+from nlab.rpc.exceptions import ApiError
+
+
+class TaskRpc(RpcGroup):
+    """Задачи процессора"""
+    def __init__(self, tracer, create_session):
+
+        super().__init__(
+            name="task", tracer=tracer, create_session=create_session
+        )
+
+    @staticmethod
+    @rpc_executor(EXECUTOR_WATCH)
+    def watch(task_id, version=None, timeout=None):
+        """
+        Ожидание изменения состояния задачи (long polling).
+
+        Ответ возвращается, как только состояние задачи отличается от
+        полученного с версией version, или по истечении timeout секунд.
+        Без version возвращается текущее состояние. Одновременно ждут не
+        больше TASK_WATCH_MAX_WAITERS вызовов, остальные завершаются
+        ошибкой OVERLOADED.
+
+        :return: version и info - то же, что compiler.info, deploy.info
+            и testcase.result
+        """
+        if timeout is not None and (
+                isinstance(timeout, bool) or
+                not isinstance(timeout, (int, float)) or timeout < 0):
+            raise ApiError(code="INVALID_PARAMS",
+                           message="`timeout` must be a number >= 0")
+
+        if timeout is None or timeout > settings.TASK_WATCH_MAX_WAIT:
+            timeout = settings.TASK_WATCH_MAX_WAIT
+
+        version, result = task_watcher.wait(task_id, version, timeout)
+        if result is None:
+            # Процессор ещё не ответил
+            return {"version": version, "info": None}
+
+        if not result["status"]:
+            errors = result.get("errors")
+            if not isinstance(errors, dict):
+                errors = {"message": errors}
+            raise ApiError(code=errors.get("code") or "PROCESSOR_SERVICE",
+                           message=errors.get("message"))
+
+        return {"version": version, "info": result["response"]}
@@ -1,14 +1,22 @@
 from datetime import datetime
 
-from sqlalchemy import desc, func
-
+from sqlalchemy import func
+from sqlalchemy.orm.attributes import flag_modified
+
+from components_utils.batch_operations import BulkCreateMixin
+from components_utils.positions import (apply_moves, assign_positions,
+                                        fetch_positions, lock_suite,
+                                        shift_positions, validate_position)
+from components_utils.search import Search
+from components_utils.template_stats import (fetch_stats, stats_dict,
+                                             stats_join)
+from components_utils.transform_cache import transform_text
 from models import Suite, Template
 from nlab.rpc import ApiError, RpcGroup
 from nlab.rpc.object import VersionNoObject, VersionObject
-from processor import transform_template_text
 
 
-class TemplateRpc(RpcGroup):
+class TemplateRpc(RpcGroup, BulkCreateMixin):
     def __init__(self, tracer, create_session):
         super().__init__(
             name="template", tracer=tracer, create_session=create_session
@@ -17,6 +25,10 @@ class TemplateRpc(RpcGroup):
             name=self.name, primary_key="template_id", entity=Template,
             create_session=create_session
         )
+        self.template_search = Search(
+            fts_columns=(Template.content,), trgm_columns=(Template.content,),
+            snippet_column=Template.content,
+        )
 
     def create(self, suite_id, content=None, is_enabled=None,
                is_compilable=None, meta=None, position=None,
@@ -29,6 +41,115 @@ class TemplateRpc(RpcGroup):
             position_before=position_before, position_after=position_after,
         )
 
+    def _bulk_object(self):
+        return self.template
+
+    def _bulk_row(self, suite_id=None, content=None, is_enabled=None,
+                  is_compilable=None, meta=None, position=None,
+                  position_before=None, position_after=None):
+        if suite_id is None:
+            raise ApiError(
+                code="MISSING_SUITE_ID",
+                message="suite_id must be given for creating template"
+            )
+
+        row = {
+            "suite_id": suite_id,
+            "created": datetime.now(),
+            "version": 1,
+            # Позиция вычисляется в _bulk_prepare
+            "position": {
+                "position": position,
+                "position_before": position_before,
+                "position_after": position_after,
+            },
+        }
+
+        if content is not None:
+            row["content"] = content
+
+        if is_enabled is not None:
+            row["is_enabled"] = is_enabled
+
+        if is_compilable is not None:
+            row["is_compilable"] = is_compilable
+
+        if meta is not None:
+            row["meta"] = meta
+
+        return row
+
+    def _bulk_prepare(self, rows, *, session):
+        suite_ids = {row["suite_id"] for row in rows}
+
+        # Наборы блокируются до конца транзакции (в одном порядке, чтобы
+        # не было взаимных блокировок), как при создании одного шаблона:
+        # иначе одновременные вызовы получили бы одинаковые позиции
+        found = {
+            str(suite_id) for suite_id, in session.query(Suite.suite_id)
+            .filter(Suite.suite_id.in_(suite_ids))
+            .order_by(Suite.suite_id)
+            .with_for_update()
+        }
+        missing = suite_ids - found
+        if missing:
+            raise ApiError(
+                code="NOT_EXISTS",
+                message="Can't find suite with id=%r" % min(missing)
+            )
+
+        # В наборах, где новые шаблоны только добавляются в конец,
+        # достаточно максимальной позиции, иначе нужны все позиции набора
+        moved_suite_ids = {
+            row["suite_id"] for row in rows
+            if any(arg is not None for arg in row["position"].values())
+        }
+
+        max_positions = dict(
+            session.query(Template.suite_id, func.max(Template.position))
+            .filter(Template.suite_id.in_(suite_ids - moved_suite_ids))
+            .group_by(Template.suite_id)
+        )
+        max_positions = {str(k): v for k, v in max_positions.items()}
+
+        for row in rows:
+            if row["suite_id"] in moved_suite_ids:
+                continue
+            position = max_positions.get(row["suite_id"]) or 0
+            row["position"] = max_positions[row["suite_id"]] = position + 1
+
+        for suite_id in moved_suite_ids:
+            self._bulk_move(
+                [row for row in rows if row["suite_id"] == suite_id],
+                suite_id, session=session
+            )
+
+    @staticmethod
+    def _bulk_move(rows, suite_id, *, session):
+        existing = fetch_positions(session, suite_id)
+
+        # Шаблон без аргументов позиции добавляется в конец
+        positions = apply_moves(existing, [
+            (row["id"], row["position"]
+             if any(arg is not None for arg in row["position"].values())
+             else {"position_before": "last"})
+            for row in rows
+        ], new_ids=[row["id"] for row in rows])
+
+        assign_positions(session, suite_id, {
+            template_id: positions[template_id]
+            for template_id, position in existing.items()
+            if positions[template_id] != position
+        })
+
+        for row in rows:
+            row["position"] = positions[row["id"]]
+
+    def _bulk_after_insert(self, ids, rows, *, session):
+        session.query(Suite).filter(
+            Suite.suite_id.in_({row["suite_id"] for row in rows})
+        ).update({Suite.updated: datetime.now()}, synchronize_session=False)
+
     def update(self, *args, **kwargs):
 
         if args:  # Получили список словарей
@@ -42,7 +163,9 @@ class TemplateRpc(RpcGroup):
             return self._store(**kwargs)
 
     def list(self, offset=None, limit=None, profile_ids=None, suite_id=None,
-             search=None, order=None, is_enabled=None, id=None, _process=None):
+             search=None, order=None, is_enabled=None, id=None, _process=None,
+             _stream=None, cursor=None, total=None, fields=None,
+             _with_stats=None):
 
         filter_q = []
 
@@ -62,30 +185,153 @@ class TemplateRpc(RpcGroup):
         if is_enabled is not None:
             filter_q.append(Template.is_enabled.is_(is_enabled))
 
-        items, total_items = self.template.filter(
+        outerjoin, fetch_args = None, []
+        if _with_stats:
+            # Статистика читается в том же запросе через LATERAL подзапрос
+            outerjoin, fetch_args = stats_join(Template.template_id)
+
+        def form_items(items):
+            result_items = []
+            for item, _, *stats in items:
+                res = self.template.project(item.to_dict(), fields)
+                if _with_stats:
+                    res["stats"] = stats_dict(stats)
+                result_items.append(res)
+            return result_items
+
+        found = self.template_search.query(search)
+        if found:
+            filter_q.append(found.filter)
+            fetch_args = fetch_args + found.fetch_args
+            form_items = found.form_items(form_items)
+
+        if _stream:
+            items = self.template.stream(
+                filter_q=filter_q, filter_by_q=filter_by_q,
+                offset=offset, limit=limit, join=join, order=order,
+                fields=fields, fetch_args=fetch_args, form_items=form_items,
+                outerjoin=outerjoin, cursor=cursor, total=total
+            )
+            if _process:
+                items.map(_process_template_inplace)
+
+            return {
+                "items": items,
+                "total": items.total,
+                "next_cursor": items.next_cursor,
+                "has_more": items.has_more,
+            }
+
+        page = self.template.filter_page(
             filter_q=filter_q, filter_by_q=filter_by_q,
-            offset=offset, limit=limit, join=join, order=order
+            offset=offset, limit=limit, join=join, order=order,
+            cursor=cursor, total=total, fields=fields,
+            fetch_args=fetch_args, form_items=form_items, outerjoin=outerjoin
         )
 
+        items = page.items
         if _process:
             items = [_process_template_inplace(item) for item in items]
 
         return {
             "items": items,
-            "total": total_items,
+            "total": page.total,
+            "next_cursor": page.next_cursor,
+            "has_more": page.has_more,
         }
 
-    def fetch(self, id, _process=None):
+    def reorder(self, suite_id, order=None, moves=None):
+        """
+        Reorders templates of the suite in one transaction.
+
+        :param suite_id: Suite id
+        :param order: Complete list of suite template ids in the new order,
+            templates get positions 1..n
+        :param moves: List of moves applied in order, every move is a dict
+            with template "id" and one of "position", "position_before" or
+            "position_after" (same as in template.create)
+        :return: New positions of all templates in the suite
+        """
+        if (order is None) == (moves is None):
+            raise ApiError(
+                code="INVALID_PARAMS",
+                message="Exactly one of `order` and `moves` must be given"
+            )
+
+        if moves is not None and (
+                not isinstance(moves, list) or
+                not all(isinstance(move, dict) for move in moves)):
+            raise ApiError(code="INVALID_PARAMS",
+                           message="`moves` must be a list of dicts")
 
         with self.create_session() as session:
-            template_model = self.template.get(id, session=session)
+            # Строка набора блокируется до конца транзакции, чтобы создание
+            # и перемещение шаблонов набора не выполнялись одновременно
+            suite_model = session.query(Suite).filter(
+                Suite.suite_id == suite_id
+            ).with_for_update().first()
+            if not suite_model:
+                raise ApiError(
+                    code="NOT_EXISTS",
+                    message="Can't find suite with id=%r" % suite_id
+                )
+
+            positions = fetch_positions(session, suite_id)
+
+            if order is not None:
+                if len(order) != len(positions) or \
+                        set(order) != set(positions):
+                    raise ApiError(
+                        code="INVALID_PARAMS",
+                        message="`order` must contain every template of "
+                                "the suite exactly once"
+                    )
+                result = {
+                    template_id: position
+                    for position, template_id in enumerate(order, start=1)
+                }
+            else:
+                result = apply_moves(positions, [
+                    (move.get("id"), {
+                        "position": move.get("position"),
+                        "position_before": move.get("position_before"),
+                        "position_after": move.get("position_after"),
+                    })
+                    for move in moves
+                ])
+
+            assign_positions(session, suite_id, {
+                template_id: position
+                for template_id, position in result.items()
+                if positions[template_id] != position
+            })
+
+            suite_model.updated = datetime.now()
+            session.commit()
+
+            return {
+                "items": [
+                    {"id": template_id, "position": position}
+                    for template_id, position in sorted(
+                        result.items(), key=lambda item: item[1]
+                    )
+                ],
+            }
+
+    def fetch(self, id, _process=None, fields=None, _with_stats=None):
+
+        with self.create_session() as session:
+            template_model = self.template.get(id, session=session,
+                                               fields=fields)
             if not template_model:
                 raise ApiError(
                     code="NOT_EXISTS",
                     message="Can't find template with id=%r" % id
                 )
 
-            item = template_model.to_dict()
+            item = self.template.project(template_model.to_dict(), fields)
+            if _with_stats:
+                item["stats"] = fetch_stats(session, id)
 
             if _process:
                 item = _process_template_inplace(item)
@@ -123,6 +369,9 @@ class TemplateRpc(RpcGroup):
                position_before=None, position_after=None, action=None):
 
         with self.create_session() as session:
+            if suite_id is not None:
+                lock_suite(session, suite_id)
+
             set_position = self._calculate_template_position(
                 position=position,
                 position_before=position_before,
@@ -173,7 +422,7 @@ class TemplateRpc(RpcGroup):
                 template_model.meta = meta
 
             if set_position is not None:
-                self._move_positions_slow_method(
+                self._move_position(
                     template_model, set_position, session=session
                 )
 
@@ -184,9 +433,6 @@ class TemplateRpc(RpcGroup):
 
             self._update_parent(template_model, session)
 
-            template = template_model.to_dict()
-            del template["stats"]
-
             session.commit()
 
             return template_model.to_dict()
@@ -240,7 +486,7 @@ class TemplateRpc(RpcGroup):
         elif fetch_position == "first":
             set_position = 1
         elif position is not None:
-            set_position = position
+            set_position = validate_position(position)
         elif do_insert or fetch_position == "last":
             # Get max template position in suite
             max_position = (session
@@ -254,42 +500,28 @@ class TemplateRpc(RpcGroup):
 
         return set_position
 
-    def _move_positions_slow_method(
+    def _move_position(
             self, template_model: Template, position: int, *, session):
         """
-        FIXME: Need correct batch solution for updating with constraint
-        There was constraint uniquenness problem in updating positions.
-        And something goes wrong with other correct methods.
-        Slow but working method
+        Moves template to position, templates at or after the position
+        are shifted by one.
 
         :param template_model: Model which position updates
         :param position: Set position
         :param session:
         :return:
         """
-        templates = (
-            session.query(Template.template_id)
-            .filter(
-                # Move all templates in suite
-                Template.suite_id == template_model.suite_id,
-                # Which positions next to set position
-                Template.position >= position,
-            )
-            .order_by(desc(Template.position))
-            .all()
-        )
-
-        for move_template in templates:
-            session.query(Template).filter(
-                Template.template_id == move_template.template_id
-            ).update(
-                    {Template.position: Template.position + 1},
-                    synchronize_session=False,
-            )
+        shift_positions(session, template_model.suite_id, position)
 
         template_model.position = position
+        # The template itself may have been shifted in the database,
+        # so position is written even if it equals the loaded value
+        flag_modified(template_model, "position")
 
 
 def _process_template_inplace(template):
-    template["content"] = transform_template_text(template["content"])
+    if "content" not in template:
+        return template
+
+    template["content"] = transform_text(template["content"])
     return template
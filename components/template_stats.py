@@ -0,0 +1,36 @@
+import settings
+from components_utils.template_stats import HitAggregator
+from nlab.rpc import RpcGroup
+
+
+class TemplateStatsRpc(RpcGroup):
+    def __init__(self, tracer, create_session):
+
+        super().__init__(
+            name="template.stats", tracer=tracer,
+            create_session=create_session
+        )
+        self.hits = HitAggregator(
+            create_session,
+            flush_interval=settings.TEMPLATE_STATS_FLUSH_INTERVAL,
+            max_buckets=settings.TEMPLATE_STATS_MAX_BUCKETS,
+            max_batch=settings.TEMPLATE_STATS_MAX_BATCH,
+        )
+
+    def ingest(self, events):
+        """
+        Приём срабатываний шаблонов от движка.
+
+        События накапливаются в памяти по дням и периодически пишутся в
+        template_stats. При переполнении буфера возвращается ошибка
+        OVERLOADED, пакет нужно отправить повторно позже.
+
+        :param events: Список [template_id, timestamp]
+        """
+        return {"accepted": self.hits.add(events)}
+
+    def status(self):
+        """
+        Счётчики принятых, записанных, отклонённых и потерянных событий
+        """
+        return self.hits.status()
@@ -1,11 +1,12 @@
 from datetime import datetime
 
-from components_utils.batch_operations import BatchUpdateMixin
+from components_utils.batch_operations import (BatchUpdateMixin,
+                                               BulkCreateMixin)
+from components_utils.processor_client import processor
 from models import Testcase
-from nlab.job import get_create_request, get_info_request, post_request
-from nlab.rpc import ApiError, RpcGroup
+from nlab.job import get_create_request, get_info_request
+from nlab.rpc import EXECUTOR_PROCESSOR, ApiError, RpcGroup, rpc_executor
 from nlab.rpc.object import VersionNoObject, VersionObject
-from settings import PROCESSOR_HOST
 
 from .profile import ProfileRpc
 
@@ -14,7 +15,7 @@ MAX_COUNT_TESTCASE_TO_RUN = 100000
 TYPE = "testcase"
 
 
-class TestcaseRpc(RpcGroup, BatchUpdateMixin):
+class TestcaseRpc(RpcGroup, BatchUpdateMixin, BulkCreateMixin):
     __test__ = False
 
     """Тесткейс"""
@@ -37,6 +38,38 @@ class TestcaseRpc(RpcGroup, BatchUpdateMixin):
 
         return result
 
+    def _bulk_object(self):
+        return self.testcase
+
+    def _bulk_row(self, **kwargs):
+        row = {"created": datetime.now()}
+        row.update(self._bulk_update_values(**kwargs))
+
+        return row
+
+    def _bulk_update_values(self, profile_id=False, title=None,
+                            description=None, replicas=None, is_common=None,
+                            author=None):
+        row = {}
+
+        if profile_id is not False:
+            # False, потому что клиент может отправлять None
+            # для очистки profile_id
+            row["profile_id"] = profile_id
+
+        values = {
+            "title": title,
+            "description": description,
+            "replicas": replicas,
+            "is_common": is_common,
+            "author": author,
+        }
+        row.update(
+            (key, value) for key, value in values.items() if value is not None
+        )
+
+        return row
+
     def _fetch(self, id):
         """Получение"""
         with self.create_session() as session:
@@ -49,7 +82,7 @@ class TestcaseRpc(RpcGroup, BatchUpdateMixin):
             return testcase_model.to_dict()
 
     def list(self, offset=None, limit=None, profile_ids=None, is_common=None,
-             order=None):
+             order=None, _stream=None, cursor=None, total=None, fields=None):
         """Получение списка"""
         filter_q = []
 
@@ -61,11 +94,25 @@ class TestcaseRpc(RpcGroup, BatchUpdateMixin):
         if is_common:
             filter_q.append(Testcase.is_common == is_common)
 
-        items, total_items = self.testcase.filter(
-            filter_q=filter_q, offset=offset, limit=limit, order=order
+        if _stream:
+            items = self.testcase.stream(
+                filter_q=filter_q, offset=offset, limit=limit, order=order,
+                fields=fields, cursor=cursor, total=total
+            )
+            return {
+                "items": items, "total": items.total,
+                "next_cursor": items.next_cursor, "has_more": items.has_more,
+            }
+
+        page = self.testcase.filter_page(
+            filter_q=filter_q, offset=offset, limit=limit, order=order,
+            cursor=cursor, total=total, fields=fields
         )
 
-        return {"items": items, "total": total_items, }
+        return {
+            "items": page.items, "total": page.total,
+            "next_cursor": page.next_cursor, "has_more": page.has_more,
+        }
 
     def remove(self, id):
         """Удаление"""
@@ -75,13 +122,13 @@ class TestcaseRpc(RpcGroup, BatchUpdateMixin):
             raise ApiError(code="NOT_EXISTS", message=e.args[0]) from e
 
     @staticmethod
+    @rpc_executor(EXECUTOR_PROCESSOR)
     def result_list(offset=None, limit=None):
         """
         Получение списка задача/статус
         """
-        result = post_request(
-            url=PROCESSOR_HOST, headers=None,
-            request_data=get_info_request(
+        result = processor.call(
+            get_info_request(
                 method="task.list", type=TYPE, offset=offset, limit=limit
             )
         )
@@ -93,13 +140,13 @@ class TestcaseRpc(RpcGroup, BatchUpdateMixin):
         raise ApiError(code="NOT_EXISTS", message=result["errors"]["message"])
 
     @staticmethod
+    @rpc_executor(EXECUTOR_PROCESSOR)
     def result(task_id):
         """
         Получение результата по задаче
         """
-        result = post_request(
-            url=PROCESSOR_HOST, headers=None,
-            request_data=get_info_request(method="task.info", task_id=task_id)
+        result = processor.call(
+            get_info_request(method="task.info", task_id=task_id)
         )
 
         result = result["result"]
@@ -110,6 +157,7 @@ class TestcaseRpc(RpcGroup, BatchUpdateMixin):
             code="PROCESSOR_SERVICE", message=result["errors"]["message"]
         )
 
+    @rpc_executor(EXECUTOR_PROCESSOR)
     def run(self, profile_id, ids):
         """
         Запуск
@@ -123,19 +171,11 @@ class TestcaseRpc(RpcGroup, BatchUpdateMixin):
                         )
             )
 
-        def form_items(items):
-            res = []
-            for item, _ in items:
-                res.append(item.to_short_dict())
-
-            return res
-
         filter_q = [
             Testcase.profile_id == profile_id, Testcase.testcase_id.in_(ids)
         ]
         testcases, _ = self.testcase.filter(
-            filter_q=filter_q, limit=len(ids),
-            form_items=form_items  # TODO: ? Так оно точно работает?
+            filter_q=filter_q, limit=len(ids), fields=Testcase.SHORT_FIELDS
         )
 
         profile = ProfileRpc(
@@ -143,9 +183,8 @@ class TestcaseRpc(RpcGroup, BatchUpdateMixin):
         )
         profile_info = profile.fetch(profile_id)
 
-        result = post_request(
-            url=PROCESSOR_HOST, headers=None,
-            request_data=get_create_request(
+        result = processor.call(
+            get_create_request(
                 method="task.create", script="scripts.testcase.run",
                 type=TYPE, args={
                     "ids": ids, "testcases": testcases,
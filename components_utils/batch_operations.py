@@ -1,3 +1,8 @@
+import uuid
+from collections import defaultdict
+
+from sqlalchemy import bindparam, literal_column, select
+
 from nlab.rpc import ApiError
 
 
@@ -14,22 +19,137 @@ class BatchUpdateHelper:
     @classmethod
     def _update(cls, instance, session, args, kwargs):
         if args:
-            return [cls._update_one(instance, session, arg) for arg in args]
+            return cls._update_many(instance, session, args)
         else:
             return cls._update_one(instance, session, kwargs)
 
     @staticmethod
     def _update_one(instance, session, kwargs):
-        # TODO: some components have more complex primary_key
-        if kwargs.get("id") is None:
-            raise ApiError(
-                code="ID_REQUIRED",
-                message="Must be id in update operation",
-            )
+        _require_id(kwargs)
         kwargs['action'] = 'update'
         kwargs['session'] = session
         return instance._store(**kwargs)
 
+    @classmethod
+    def _update_many(cls, instance, session, args):
+        """
+        Updates list of objects. All targets are loaded with one IN query,
+        missing objects are reported per item instead of failing the batch.
+        """
+        version_object = instance._bulk_object()
+        ids = [str(_require_id(item)) for item in args]
+
+        key_field = getattr(version_object.entity, version_object.primary_key)
+        found = {
+            str(key) for key, in session.query(key_field)
+            .filter(key_field.in_(set(ids)))
+        }
+
+        if instance._bulk_update_values is None:
+            return [
+                cls._update_one(instance, session, item) if id in found
+                else cls._not_exists(version_object, id)
+                for id, item in zip(ids, args)
+            ]
+
+        changes = {}
+        for index, (id, item) in enumerate(zip(ids, args)):
+            values = _call_item(instance._bulk_update_values, index, {
+                key: value for key, value in item.items() if key != "id"
+            })
+            if id in found:
+                changes.setdefault(id, {}).update(values)
+
+        table = version_object.entity.__table__
+        if instance._bulk_skip_unchanged:
+            cls._drop_unchanged(session, table, changes)
+        cls._write(session, table, changes)
+        instance._bulk_after_update(
+            [id for id, values in changes.items() if values], session=session
+        )
+
+        models = {
+            str(getattr(model, version_object.primary_key)): model
+            for model in session.query(version_object.entity)
+            .filter(key_field.in_(list(changes)))
+            .populate_existing()
+        }
+        return [
+            models[id].to_dict() if id in models
+            else cls._not_exists(version_object, id)
+            for id in ids
+        ]
+
+    @staticmethod
+    def _drop_unchanged(session, table, changes):
+        """
+        Removes values equal to the current ones, so rows without real
+        changes are not written and get no new version.
+        """
+        keys = sorted({key for values in changes.values() for key in values})
+        if not keys:
+            return
+
+        primary_key = table.primary_key.columns.values()[0]
+        current = {
+            str(row[primary_key]): row
+            for row in session.execute(
+                select([primary_key] + [table.c[key] for key in keys])
+                .where(primary_key.in_(list(changes)))
+            )
+        }
+
+        for id, values in changes.items():
+            row = current.get(id)
+            if row is None:
+                continue
+            for key in [key for key, value in values.items()
+                        if row[table.c[key]] == value]:
+                del values[key]
+
+    @staticmethod
+    def _write(session, table, changes):
+        """
+        Rows with the same set of changed columns are written with one
+        executemany UPDATE, version is incremented in SQL. Rows without
+        changed columns are not written.
+        """
+        primary_key = table.primary_key.columns.values()[0]
+        has_version = "version" in table.c
+
+        groups = defaultdict(list)
+        for id, values in changes.items():
+            if not values:
+                continue
+            params = {"b_" + key: value for key, value in values.items()}
+            params["b_id"] = id
+            groups[tuple(sorted(values))].append(params)
+
+        for keys, params in groups.items():
+            values = {table.c[key]: bindparam("b_" + key) for key in keys}
+            if has_version:
+                values[table.c.version] = table.c.version + 1
+
+            if not values:
+                continue
+
+            session.execute(
+                table.update()
+                .where(primary_key == bindparam("b_id"))
+                .values(values),
+                params,
+            )
+
+    @staticmethod
+    def _not_exists(version_object, id):
+        return {
+            "id": id,
+            "errors": ApiError(
+                code="NOT_EXISTS",
+                message="Can't find %s with id=%r" % (version_object.name, id)
+            ).errors,
+        }
+
 
 class BatchCreateHelper:
     @classmethod
@@ -57,9 +177,175 @@ class BatchCreateMixin:
         return BatchCreateHelper.create(self, args, kwargs)
 
 
-class BatchUpdateMixin:
+class BulkObjectMixin:
+    def _bulk_object(self):
+        """
+        :return: VersionObject of the component
+        """
+        raise NotImplementedError
+
+
+class BatchUpdateMixin(BulkObjectMixin):
     """
-    Adds update method
+    Adds update method.
+
+    Component can implement _bulk_update_values returning changed column
+    values of one item, then a list of items is written set-based,
+    otherwise every item goes through _store.
+
+    With _bulk_skip_unchanged values equal to the current ones are not
+    written, rows without changes keep their version. _store of such a
+    component must follow the same rule.
     """
+    _bulk_update_values = None
+    _bulk_skip_unchanged = False
+
     def update(self, *args, **kwargs):
         return BatchUpdateHelper.update(self, args, kwargs)
+
+    def _bulk_after_update(self, ids, *, session):
+        pass
+
+
+class BulkCreateHelper:
+    """
+    Set-based creation of many objects in one transaction.
+
+    Rows are built and validated in memory, primary keys are generated
+    in memory, and rows are written with multi-row INSERT statements of
+    CHUNK_SIZE rows. Created objects are reloaded with one IN query.
+    """
+    CHUNK_SIZE = 1000
+
+    @classmethod
+    def create(cls, instance, items):
+        if not isinstance(items, list) or not items:
+            raise ApiError(
+                code="INVALID_PARAMS",
+                message="items must be a non-empty list",
+            )
+
+        version_object = instance._bulk_object()
+        table = version_object.entity.__table__
+        primary_key = table.primary_key.columns.values()[0]
+
+        rows = [cls._row(instance, index, item)
+                for index, item in enumerate(items)]
+
+        for row in rows:
+            row.setdefault(primary_key.name, str(uuid.uuid4()))
+
+        with instance.create_session() as session:
+            instance._bulk_prepare(rows, session=session)
+
+            for index, row in enumerate(rows):
+                cls._validate(table, index, row)
+
+            cls._insert(session, table, rows)
+
+            ids = [row[primary_key.name] for row in rows]
+            instance._bulk_after_insert(ids, rows, session=session)
+
+            key_field = getattr(version_object.entity,
+                                version_object.primary_key)
+            models = {
+                str(getattr(model, version_object.primary_key)): model
+                for model in session.query(version_object.entity)
+                .filter(key_field.in_(ids))
+            }
+            result = [models[id].to_dict() for id in ids]
+
+            session.commit()
+            return result
+
+    @staticmethod
+    def _row(instance, index, item):
+        return _call_item(instance._bulk_row, index, item)
+
+    @staticmethod
+    def _validate(table, index, row):
+        for column in table.columns:
+            value = row.get(column.name)
+            has_default = column.default is not None or \
+                column.server_default is not None
+            if value is None and not column.nullable and \
+                    not (column.name not in row and has_default):
+                raise ApiError(
+                    code="INVALID_PARAMS",
+                    message="Item %d: %s must be given" % (index, column.name),
+                )
+
+    @classmethod
+    def _insert(cls, session, table, rows):
+        keys = set().union(*rows)
+        for start in range(0, len(rows), cls.CHUNK_SIZE):
+            chunk = [cls._complete(table, keys, row)
+                     for row in rows[start:start + cls.CHUNK_SIZE]]
+            session.execute(table.insert().values(chunk))
+
+    @staticmethod
+    def _complete(table, keys, row):
+        """
+        Multi-row INSERT requires the same keys in all rows, missing
+        values are taken from column defaults.
+        """
+        row = dict(row)
+        for key in keys - row.keys():
+            default = table.c[key].default
+            if default is not None and default.is_scalar:
+                row[key] = default.arg
+            else:
+                row[key] = literal_column("DEFAULT")
+        return row
+
+
+class BulkCreateMixin(BulkObjectMixin):
+    """
+    Adds bulk_create method.
+
+    Component implements _bulk_object returning its VersionObject and
+    _bulk_row building table row values for one item, and can override
+    _bulk_prepare and _bulk_after_insert.
+    """
+    def bulk_create(self, items):
+        return BulkCreateHelper.create(self, items)
+
+    def _bulk_row(self, **kwargs):
+        raise NotImplementedError
+
+    def _bulk_prepare(self, rows, *, session):
+        pass
+
+    def _bulk_after_insert(self, ids, rows, *, session):
+        pass
+
+
+def _require_id(item):
+    # TODO: some components have more complex primary_key
+    if not isinstance(item, dict) or item.get("id") is None:
+        raise ApiError(
+            code="ID_REQUIRED",
+            message="Must be id in update operation",
+        )
+    return item["id"]
+
+
+def _call_item(func, index, item):
+    if not isinstance(item, dict):
+        raise ApiError(
+            code="INVALID_PARAMS",
+            message="Item %d must be dict" % index,
+        )
+
+    try:
+        return func(**item)
+    except TypeError as e:
+        raise ApiError(
+            code="INVALID_PARAMS",
+            message="Item %d: %s" % (index, e),
+        ) from e
+    except ApiError as e:
+        raise ApiError(
+            code=e.code,
+            message="Item %d: %s" % (index, e),
+        ) from e
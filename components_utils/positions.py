@@ -0,0 +1,238 @@
+"""
+Set-based template reordering.
+
+The ``suite_id_positions`` unique constraint is not deferrable, so
+PostgreSQL checks it after every row and a plain
+``UPDATE ... SET position = position + 1`` fails in the middle of the
+shift. Positions are therefore written in two phases: the first statement
+moves affected rows to negative positions, which never collide with the
+positive ones, and the second flips the sign back. That only works for
+positions >= 1, so positions from clients are checked by
+validate_position.
+
+Functions reading or shifting positions of a suite lock its row first,
+so concurrent moves in one suite are applied one after another.
+"""
+from sqlalchemy import Integer, and_, bindparam, cast, func, select
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+
+from nlab.rpc import ApiError
+from tables import suites_table, templates_table
+
+
+def validate_position(position):
+    """
+    :return: position if it is an integer >= 1
+    """
+    if isinstance(position, bool) or not isinstance(position, int) or \
+            position < 1:
+        raise ApiError(
+            code="INVALID_POSITION",
+            message="Position must be an integer >= 1, got %r" % (position,)
+        )
+
+    return position
+
+
+def lock_suite(session, suite_id):
+    """
+    Locks the suite row (SELECT ... FOR UPDATE) until the end of the
+    transaction
+    """
+    session.execute(
+        select([suites_table.c.id])
+        .where(suites_table.c.id == suite_id)
+        .with_for_update()
+    )
+
+
+def shift_positions(session, suite_id, position, step=1):
+    """
+    Shifts templates of the suite at or after position by step.
+    Takes two statements regardless of the suite size.
+
+    :param session: Database session
+    :param suite_id: Suite id
+    :param position: First position to shift
+    :param step: Shift size
+    """
+    validate_position(position)
+    lock_suite(session, suite_id)
+
+    table = templates_table
+    session.execute(
+        table.update()
+        .where(and_(table.c.suite_id == suite_id,
+                    table.c.position >= position))
+        .values(position=-(table.c.position + step))
+    )
+    _restore_sign(session, suite_id)
+
+
+def assign_positions(session, suite_id, positions):
+    """
+    Sets positions of many templates of the suite in two statements.
+
+    Resulting positions of all templates in the suite must be unique,
+    templates not mentioned in positions keep their positions.
+
+    :param session: Database session
+    :param suite_id: Suite id
+    :param positions: Dict template id -> new position
+    """
+    if not positions:
+        return
+
+    table = templates_table
+    ids, values = zip(*positions.items())
+    moved = select([
+        func.unnest(
+            cast(bindparam("template_ids", list(ids)), ARRAY(UUID))
+        ).label("template_id"),
+        func.unnest(
+            cast(bindparam("positions", list(values)), ARRAY(Integer))
+        ).label("position"),
+    ]).alias("moved")
+
+    session.execute(
+        table.update()
+        .where(and_(table.c.suite_id == suite_id,
+                    table.c.id == moved.c.template_id))
+        .values(position=-moved.c.position)
+    )
+    _restore_sign(session, suite_id)
+
+
+def fetch_positions(session, suite_id):
+    """
+    Locks the suite and reads its positions.
+
+    :return: Dict template id -> position for all templates of the suite
+    """
+    lock_suite(session, suite_id)
+
+    table = templates_table
+    rows = session.execute(
+        select([table.c.id, table.c.position])
+        .where(table.c.suite_id == suite_id)
+    )
+    return {str(template_id): position for template_id, position in rows}
+
+
+def apply_moves(positions, moves, *, new_ids=()):
+    """
+    Applies moves to positions in memory. Every move behaves like a single
+    template move: templates at or after the target position are shifted
+    by one and the template takes the freed position. Moves after the last
+    position shift nothing and cost O(1).
+
+    :param positions: Dict template id -> position, is not modified
+    :param moves: List of (template id, position) pairs, applied in order.
+        position is an int or a dict of target_position arguments, which
+        is resolved against positions after the previous moves
+    :param new_ids: Templates missing in positions, their moves add them
+    :return: Dict template id -> new position
+    """
+    result = dict(positions)
+    new_ids = set(new_ids)
+    top = max(result.values(), default=0)
+    for template_id, position in moves:
+        if isinstance(position, dict):
+            position = target_position(result, top=top, **position)
+        validate_position(position)
+        if template_id not in result and template_id not in new_ids:
+            raise ApiError(
+                code="NOT_EXISTS",
+                message="Can't find template with id=%r in suite" % template_id
+            )
+
+        if position <= top:
+            top = 0
+            for other_id, other_position in result.items():
+                if other_id != template_id and other_position >= position:
+                    other_position += 1
+                    result[other_id] = other_position
+                top = max(top, other_position)
+
+        result[template_id] = position
+        top = max(top, position)
+
+    return result
+
+
+def target_position(positions, *, position=None, position_before=None,
+                    position_after=None, top=None):
+    """
+    Calculates target position of a move from in-memory positions, like
+    TemplateRpc._calculate_template_position does for a single template.
+
+    :param positions: Dict template id -> position
+    :param position: Set position
+    :param position_before: Position before template uuid, "first" or
+        "last"
+    :param position_after: Position after template uuid, "first" or "last"
+    :param top: Max position if it is already known
+    :return: Target position
+    """
+    if sum(arg is not None
+           for arg in (position, position_before, position_after)) != 1:
+        raise ApiError(
+            code="INVALID_POSITION",
+            message="Exactly one of `position`, `position_before` "
+                    "and `position_after` arguments must be given!"
+        )
+
+    if position is not None:
+        return validate_position(position)
+
+    # Like TemplateRpc._calculate_template_position, "first" and "last"
+    # are accepted by both arguments
+    if "first" in (position_before, position_after):
+        return 1
+
+    if "last" in (position_before, position_after):
+        if top is None:
+            top = max(positions.values(), default=0)
+        return top + 1
+
+    template_id = position_before or position_after
+    if template_id not in positions:
+        raise ApiError(
+            code="NOT_EXISTS",
+            message="Can't find template with id=%r in suite" % template_id
+        )
+
+    if position_after:
+        return positions[template_id] + 1
+    return positions[template_id]
+
+
+def move_templates(session, suite_id, moves):
+    """
+    Moves many templates of the suite. Positions of the suite are read
+    once, moves are applied in memory and only changed rows are written.
+
+    :param session: Database session
+    :param suite_id: Suite id
+    :param moves: List of (template id, position) pairs, applied in order
+    :return: Dict template id -> position for all templates of the suite
+    """
+    positions = fetch_positions(session, suite_id)
+    result = apply_moves(positions, moves)
+
+    assign_positions(session, suite_id, {
+        template_id: position
+        for template_id, position in result.items()
+        if positions[template_id] != position
+    })
+
+    return result
+
+
+def _restore_sign(session, suite_id):
+    table = templates_table
+    session.execute(
+        table.update()
+        .where(and_(table.c.suite_id == suite_id, table.c.position < 0))
+        .values(position=-table.c.position)
+    )
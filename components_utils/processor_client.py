@@ -0,0 +1,34 @@
+"""
+Shared client of the processor configured from settings.
+
+Proxy components call the processor through it, so all of them share
+one pool of keep-alive connections and one set of latency metrics.
+task_watcher polls task states for task.watch and the gateway events
+endpoint.
+"""
+import settings
+from nlab.job import TaskWatcher, get_client
+
+processor = get_client(
+    settings.PROCESSOR_HOST,
+    connect_timeout=settings.PROCESSOR_CONNECT_TIMEOUT,
+    read_timeout=settings.PROCESSOR_READ_TIMEOUT,
+    pool_size=settings.PROCESSOR_POOL_SIZE,
+    headers=settings.HEADERS,
+    method_concurrency=settings.PROCESSOR_METHOD_CONCURRENCY,
+    bulkhead_timeout=settings.PROCESSOR_BULKHEAD_TIMEOUT,
+    failure_threshold=settings.PROCESSOR_FAILURE_THRESHOLD,
+    reset_timeout=settings.PROCESSOR_RESET_TIMEOUT,
+    retries=settings.PROCESSOR_RETRIES,
+    retry_backoff=settings.PROCESSOR_RETRY_BACKOFF,
+    coalesce_ttl=settings.PROCESSOR_COALESCE_TTL,
+)
+
+task_watcher = TaskWatcher(
+    processor,
+    poll_interval=settings.TASK_WATCH_POLL_INTERVAL,
+    idle_timeout=settings.TASK_WATCH_IDLE_TIMEOUT,
+    max_tasks=settings.TASK_WATCH_MAX_TASKS,
+    max_waiters=settings.TASK_WATCH_MAX_WAITERS,
+    fetch_workers=settings.TASK_WATCH_FETCH_WORKERS,
+)
@@ -0,0 +1,103 @@
+"""
+Server-side search for list methods.
+
+A column set is searched by full text (tsvector @@ plainto_tsquery) and by
+substring (ILIKE, served by pg_trgm GIN indexes). Full text expressions
+are built by nlab.db.to_tsvector, the same function is used for the
+expression indexes in tables.py, so PostgreSQL keeps the indexes up to
+date on write and the planner matches them in queries. A tsvector is
+limited to 1 MB, so large text columns are searched by substring only.
+
+Rows of a searched query get two extra columns, rank and snippet, which
+are returned in the "search" key of list items.
+"""
+from sqlalchemy import func, null, or_
+
+from nlab.db import to_tsvector, ts_config
+
+# Options of ts_headline for snippets
+SNIPPET_OPTIONS = "MaxFragments=2, MaxWords=20, MinWords=5, " \
+                  "StartSel=<mark>, StopSel=</mark>"
+
+# Snippets are taken from this many first characters of the column,
+# ts_headline parses the whole text it gets
+SNIPPET_MAX_CHARS = 20000
+
+
+def _escape_like(value):
+    return value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+class Search:
+    def __init__(self, *, fts_columns=(), trgm_columns=(),
+                 snippet_column=None):
+        """
+        :param fts_columns: Columns of the full text document, must match
+            a to_tsvector expression index
+        :param trgm_columns: Columns searched by substring, must have
+            gin_trgm_ops indexes
+        :param snippet_column: Column for highlighted snippets
+        """
+        if not fts_columns and not trgm_columns:
+            raise ValueError("fts_columns or trgm_columns must be given")
+
+        self.fts_columns = fts_columns
+        self.trgm_columns = trgm_columns
+        self.snippet_column = snippet_column
+
+    def query(self, search):
+        """
+        :param search: Text from the request
+        :return: SearchQuery or None if search is empty
+        """
+        if search is None or not str(search).strip():
+            return None
+
+        return SearchQuery(self, str(search).strip())
+
+
+class SearchQuery:
+    def __init__(self, search, text):
+        self.text = text
+
+        conditions = []
+        if search.fts_columns:
+            vector = to_tsvector(*search.fts_columns)
+            tsquery = func.plainto_tsquery(ts_config(), text)
+            conditions.append(vector.op("@@")(tsquery))
+            rank = func.ts_rank(vector, tsquery)
+        else:
+            rank = func.similarity(search.trgm_columns[0], text)
+
+        pattern = "%" + _escape_like(text) + "%"
+        conditions.extend(column.ilike(pattern, escape="!")
+                          for column in search.trgm_columns)
+
+        snippet = null()
+        if search.snippet_column is not None and search.fts_columns:
+            snippet = func.ts_headline(
+                ts_config(),
+                func.left(search.snippet_column, SNIPPET_MAX_CHARS),
+                tsquery, SNIPPET_OPTIONS,
+            )
+
+        self.filter = or_(*conditions)
+        self.fetch_args = [rank.label("search_rank"),
+                           snippet.label("search_snippet")]
+
+    def form_items(self, form_items):
+        """
+        Wraps form_items of a list query which fetch_args end with
+        self.fetch_args: form_items gets rows without search columns,
+        search results are added to formed items.
+        """
+        count = len(self.fetch_args)
+
+        def inner(items):
+            result = form_items([tuple(row)[:-count] for row in items])
+            for item, row in zip(result, items):
+                rank, snippet = tuple(row)[-count:]
+                item["search"] = {"rank": rank, "snippet": snippet}
+            return result
+
+        return inner
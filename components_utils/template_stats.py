@@ -0,0 +1,314 @@
+"""
+Template usage statistics.
+
+Hits of templates are stored in template_stats aggregated per day:
+hits counter and time of the last hit. Statistics of a template are
+computed from its rows found by the primary key (template_id, day).
+Days are UTC days.
+
+HitAggregator collects hit events in memory per (template, day) and a
+background thread writes them with bulk upserts, so a hit costs a dict
+update instead of a row write.
+"""
+import atexit
+import logging
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import (BigInteger, Date, DateTime, bindparam, cast, func,
+                        select, true)
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert
+
+from nlab.rpc import ApiError
+from tables import template_stats_table, templates_table
+
+STATS_FIELDS = ("last_used", "used_7d", "used_30d")
+
+log = logging.getLogger(__name__)
+
+
+def _hits_since(days):
+    table = template_stats_table
+    return cast(
+        func.coalesce(
+            func.sum(table.c.hits).filter(
+                table.c.day > _utc_today() - days
+            ),
+            0,
+        ),
+        BigInteger,
+    )
+
+
+def _utc_today():
+    return cast(func.timezone("UTC", func.now()), Date)
+
+
+def usage_stats(template_id):
+    """
+    Select of one row with last_used, used_7d and used_30d.
+
+    :param template_id: Template id or a column, e.g. Template.template_id
+        to use the select as a LATERAL subquery
+    """
+    table = template_stats_table
+    return select([
+        func.max(table.c.last_hit).label("last_used"),
+        _hits_since(7).label("used_7d"),
+        _hits_since(30).label("used_30d"),
+    ]).where(table.c.template_id == template_id)
+
+
+def stats_join(template_id_column):
+    """
+    :return: outerjoin arguments and fetch_args adding statistics columns
+        to a query of templates
+    """
+    stats = usage_stats(template_id_column).lateral("usage_stats")
+    return [stats, true()], [stats.c[name] for name in STATS_FIELDS]
+
+
+def fetch_stats(session, template_id):
+    return stats_dict(session.execute(usage_stats(template_id)).first())
+
+
+def stats_dict(values):
+    return dict(zip(STATS_FIELDS, values))
+
+
+def write_hits(session, buckets):
+    """
+    Adds hits to template_stats with one upsert.
+
+    :param buckets: Dict (template_id, day) -> (hits, last_hit)
+    :return: Set of written (template_id, day), buckets of missing
+        templates are skipped
+    """
+    if not buckets:
+        return set()
+
+    keys, values = zip(*buckets.items())
+    template_ids, days = zip(*keys)
+    hits, last_hits = zip(*values)
+
+    rows = select([
+        func.unnest(cast(bindparam("template_ids", list(template_ids)),
+                         ARRAY(UUID))).label("template_id"),
+        func.unnest(cast(bindparam("days", list(days)),
+                         ARRAY(Date))).label("day"),
+        func.unnest(cast(bindparam("hits", list(hits)),
+                         ARRAY(BigInteger))).label("hits"),
+        func.unnest(cast(bindparam("last_hits", list(last_hits)),
+                         ARRAY(DateTime(timezone=True)))).label("last_hit"),
+    ]).alias("new_hits")
+
+    table = template_stats_table
+    statement = insert(table).from_select(
+        ["template_id", "day", "hits", "last_hit"],
+        select([rows.c.template_id, rows.c.day, rows.c.hits, rows.c.last_hit])
+        .select_from(rows.join(templates_table,
+                               templates_table.c.id == rows.c.template_id))
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.template_id, table.c.day],
+        set_={
+            "hits": table.c.hits + statement.excluded.hits,
+            "last_hit": func.greatest(table.c.last_hit,
+                                      statement.excluded.last_hit),
+        },
+    )
+
+    statement = statement.returning(table.c.template_id, table.c.day)
+
+    return {(str(template_id), day)
+            for template_id, day in session.execute(statement)}
+
+
+class HitAggregator:
+    """
+    Write-behind aggregation of template hits.
+
+    Memory is bounded by max_buckets (template, day) pairs. A batch which
+    would exceed it is rejected with OVERLOADED, the caller should retry
+    it later. Hits which could not be written (missing templates, failed
+    flushes without room to keep them) are counted as lost.
+    """
+    def __init__(self, create_session, *, flush_interval=10.0,
+                 max_buckets=100000, max_batch=100000,
+                 chunk_size=5000):
+        self.create_session = create_session
+        self.flush_interval = flush_interval
+        self.max_buckets = max_buckets
+        self.max_batch = max_batch
+        self.chunk_size = chunk_size
+
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+        self._counters = {
+            "accepted_hits": 0,
+            "rejected_hits": 0,
+            "written_hits": 0,
+            "lost_hits": 0,
+            "flushes": 0,
+            "failed_flushes": 0,
+        }
+        self._last_flush = None
+        self._last_error = None
+
+    def add(self, events):
+        """
+        :param events: List of [template_id, timestamp] or dicts with
+            template_id and timestamp (unix time in seconds)
+        :return: Count of accepted hits
+        """
+        hits = self._parse(events)
+
+        with self._lock:
+            new_keys = {key for key, _ in hits if key not in self._buckets}
+            if len(self._buckets) + len(new_keys) > self.max_buckets:
+                self._counters["rejected_hits"] += len(hits)
+                self._wakeup.set()
+                raise ApiError(
+                    code="OVERLOADED",
+                    message="Too many pending template hits, retry later",
+                )
+
+            for key, last_hit in hits:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    self._buckets[key] = [1, last_hit]
+                else:
+                    bucket[0] += 1
+                    if last_hit > bucket[1]:
+                        bucket[1] = last_hit
+
+            self._counters["accepted_hits"] += len(hits)
+            if len(self._buckets) * 2 > self.max_buckets:
+                # Flush early when half of the memory bound is used
+                self._wakeup.set()
+
+        self._start()
+        return len(hits)
+
+    def flush(self):
+        """
+        Writes pending hits to the database
+        """
+        with self._flush_lock:
+            with self._lock:
+                buckets, self._buckets = self._buckets, {}
+
+            if not buckets:
+                return
+
+            items = list(buckets.items())
+            for start in range(0, len(items), self.chunk_size):
+                chunk = dict(items[start:start + self.chunk_size])
+                try:
+                    with self.create_session() as session:
+                        written = write_hits(session, {
+                            key: tuple(value) for key, value in chunk.items()
+                        })
+                        session.commit()
+                except Exception as e:
+                    log.exception("Template hits flush failed")
+                    with self._lock:
+                        self._last_error = str(e)
+                        self._counters["failed_flushes"] += 1
+                    self._restore(dict(items[start:]))
+                    return
+
+                with self._lock:
+                    for key, (hits, _) in chunk.items():
+                        # Hits of missing templates are not written
+                        counter = "written_hits" if key in written \
+                            else "lost_hits"
+                        self._counters[counter] += hits
+
+            with self._lock:
+                self._counters["flushes"] += 1
+                self._last_flush = datetime.now(timezone.utc)
+
+    def status(self):
+        with self._lock:
+            return dict(
+                self._counters,
+                pending_buckets=len(self._buckets),
+                pending_hits=sum(value[0] for value in self._buckets.values()),
+                max_buckets=self.max_buckets,
+                last_flush=self._last_flush,
+                last_error=self._last_error,
+            )
+
+    def _parse(self, events):
+        if not isinstance(events, list):
+            raise ApiError(code="INVALID_PARAMS",
+                           message="events must be a list")
+
+        if len(events) > self.max_batch:
+            raise ApiError(
+                code="INVALID_PARAMS",
+                message="Too many events in one batch, max %d" % self.max_batch
+            )
+
+        hits = []
+        for index, event in enumerate(events):
+            if isinstance(event, dict):
+                event = (event.get("template_id"), event.get("timestamp"))
+
+            try:
+                template_id, timestamp = event
+                template_id = str(uuid.UUID(template_id))
+                last_hit = datetime.fromtimestamp(timestamp, timezone.utc)
+            except (TypeError, ValueError, AttributeError, OverflowError):
+                raise ApiError(
+                    code="INVALID_PARAMS",
+                    message="Event %d must be [template_id, timestamp]" % index
+                )
+
+            hits.append(((template_id, last_hit.date()), last_hit))
+
+        return hits
+
+    def _restore(self, buckets):
+        """
+        Returns not written buckets, hits which don't fit are lost
+        """
+        with self._lock:
+            for key, (hits, last_hit) in buckets.items():
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket[0] += hits
+                    bucket[1] = max(bucket[1], last_hit)
+                elif len(self._buckets) < self.max_buckets:
+                    self._buckets[key] = [hits, last_hit]
+                else:
+                    self._counters["lost_hits"] += hits
+
+    def _start(self):
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._thread = threading.Thread(
+                target=self._run, name="template-hits-flush", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Template hits flush failed")
@@ -0,0 +1,82 @@
+"""
+Content-addressed cache of processor.transform_template_text.
+
+Results are keyed by a hash of the source text, so a template or a
+dictionary is parsed once per content version whatever list call reads
+it. Entries are evicted in LRU order when the total size of cached
+source and result texts exceeds max_chars.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import settings
+from processor import transform_template_text
+
+
+class TransformCache:
+    def __init__(self, transform, *, max_chars):
+        """
+        :param transform: Function of one text argument
+        :param max_chars: Bound of the total length of cached texts
+        """
+        self.transform = transform
+        self.max_chars = max_chars
+
+        self._entries = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, text):
+        if text is None or self.max_chars <= 0:
+            return self.transform(text)
+
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Transformation runs without the lock, the same text may be
+        # transformed twice by concurrent calls
+        result = self.transform(text)
+
+        size = len(text) + len(result)
+        if size > self.max_chars:
+            return result
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (result, size)
+                self._chars += size
+
+            while self._chars > self.max_chars:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._chars -= evicted
+
+        return result
+
+    def status(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "chars": self._chars,
+                "max_chars": self.max_chars,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+
+
+transform_text = TransformCache(
+    transform_template_text, max_chars=settings.TRANSFORM_CACHE_MAX_CHARS
+)
@@ -0,0 +1,298 @@
+"""
+Batched version history.
+
+Changed objects of a flush are collected in the after_flush event of the
+sessions of one sessionmaker (see VersionHistory.listen) and their
+versions are written in one statement. Set-based code paths
+that bypass the ORM call VersionHistory.write directly.
+
+Without delta_column versions are copied by INSERT ... SELECT inside the
+database. With delta_column the column is stored as periodic full
+snapshots plus zlib compressed line diffs against the previous version:
+version rows get either the column value (snapshot, delta is NULL) or
+delta with the column set to NULL. delta_depth is the number of deltas
+since the last snapshot, a snapshot is written every snapshot_interval
+versions or when the delta is not smaller than the value itself.
+If versions_table has <delta_column>_size and <delta_column>_hash
+columns, size in bytes and sha256 of the value are stored there, so
+version metadata can be listed without restoring values.
+"""
+import difflib
+import hashlib
+import json
+import zlib
+
+from sqlalchemy import and_, event, func, inspect, select
+
+
+class BrokenVersionChain(ValueError):
+    """
+    A delta version has no snapshot before it, its value can't be restored
+    """
+
+
+def encode_delta(source, target):
+    """
+    Line diff of target against source: list of copied source line ranges
+    and inserted text, compressed with zlib.
+    """
+    source_lines = source.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+
+    ops = []
+    matcher = difflib.SequenceMatcher(None, source_lines, target_lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(target_lines[j1:j2]))
+
+    return zlib.compress(json.dumps(ops).encode("utf-8"))
+
+
+def apply_delta(source, delta):
+    source_lines = source.splitlines(keepends=True)
+
+    parts = []
+    for op in json.loads(zlib.decompress(delta).decode("utf-8")):
+        if isinstance(op, list):
+            parts.extend(source_lines[op[0]:op[1]])
+        else:
+            parts.append(op)
+
+    return "".join(parts)
+
+
+def digest(value):
+    """
+    :return: Size in bytes and sha256 hex digest of the value
+    """
+    if value is None:
+        return None, None
+
+    data = value.encode("utf-8")
+    return len(data), hashlib.sha256(data).hexdigest()
+
+
+def pack_version(previous, value, previous_depth, snapshot_interval):
+    """
+    Chooses storage of a version.
+
+    :param previous: Value of the previous version or None if there is none
+    :param value: Value of the new version
+    :param previous_depth: delta_depth of the previous version
+    :param snapshot_interval: Max count of deltas in a row
+    :return: Stored value, delta and delta_depth of the new version
+    """
+    if previous is None or value is None or \
+            previous_depth + 1 >= snapshot_interval:
+        return value, None, 0
+
+    delta = encode_delta(previous, value)
+    if len(delta) >= len(value.encode("utf-8")):
+        return value, None, 0
+
+    return None, delta, previous_depth + 1
+
+
+class VersionHistory:
+    def __init__(self, entity, versions_table, *,
+                 ignore=("version", "updated"), delta_column=None,
+                 snapshot_interval=20):
+        """
+        :param entity: Versioned model
+        :param versions_table: Table of versions, columns with the same
+            names as in the model table are copied
+        :param ignore: Columns which changes alone don't make a new version
+        :param delta_column: Column stored as deltas, versions_table must
+            have delta and delta_depth columns
+        :param snapshot_interval: Max count of deltas between snapshots
+        """
+        self.entity = entity
+        self.table = entity.__table__
+        self.versions_table = versions_table
+        self.delta_column = delta_column
+        self.snapshot_interval = snapshot_interval
+
+        self.columns = [column.name for column in versions_table.columns
+                        if column.name in self.table.c]
+
+        self.digest_columns = None
+        if delta_column is not None:
+            size, hash = delta_column + "_size", delta_column + "_hash"
+            if size in versions_table.c and hash in versions_table.c:
+                self.digest_columns = (size, hash)
+
+        primary_key = self.table.primary_key.columns.values()[0]
+        self.primary_key = primary_key
+        self.version_key = versions_table.c[primary_key.name]
+        # Versions are replayed in this order, the primary key of versions
+        # makes it stable for versions with equal numbers
+        self.version_order = [versions_table.c.version] + \
+            list(versions_table.primary_key.columns)
+
+        mapper = inspect(entity)
+        self._id_attr = mapper.get_property_by_column(primary_key).key
+        self._tracked_attrs = [
+            mapper.get_property_by_column(self.table.c[name]).key
+            for name in self.columns
+            if name not in ignore and name != primary_key.name
+        ]
+
+    def listen(self, target):
+        """
+        Writes versions after flushes of sessions created by target
+        (sessionmaker or Session)
+        """
+        if not event.contains(target, "after_flush", self._after_flush):
+            event.listen(target, "after_flush", self._after_flush)
+
+    def write(self, connection, ids):
+        """
+        Writes current state of objects with ids as new versions
+        """
+        if not ids:
+            return
+
+        if self.delta_column is None:
+            connection.execute(self.versions_table.insert().from_select(
+                self.columns,
+                select([self.table.c[name] for name in self.columns])
+                .where(self.primary_key.in_(ids))
+            ))
+            return
+
+        latest = self._latest(connection, ids)
+
+        rows = []
+        for row in connection.execute(
+                select([self.table.c[name] for name in self.columns])
+                .where(self.primary_key.in_(ids))):
+            row = dict(row)
+            if self.digest_columns is not None:
+                row.update(zip(self.digest_columns,
+                               digest(row[self.delta_column])))
+
+            previous, previous_depth, previous_version = latest.get(
+                row[self.primary_key.name], (None, 0, None)
+            )
+            if previous_version is not None and \
+                    previous_version >= row["version"]:
+                # Versions with equal numbers are not stored as deltas,
+                # otherwise the order of restoring would be ambiguous
+                previous = None
+
+            row[self.delta_column], row["delta"], row["delta_depth"] = \
+                pack_version(previous, row[self.delta_column],
+                             previous_depth, self.snapshot_interval)
+            rows.append(row)
+
+        connection.execute(self.versions_table.insert(), rows)
+
+    def contents(self, connection, id, versions):
+        """
+        Restores delta_column values of versions of one object.
+
+        :return: Dict version -> value
+        """
+        versions = set(versions)
+        if not versions:
+            return {}
+
+        table = self.versions_table
+        base = connection.execute(
+            select([func.max(table.c.version)])
+            .where(and_(self.version_key == id,
+                        table.c.version <= min(versions),
+                        table.c.delta.is_(None)))
+        ).scalar()
+
+        rows = connection.execute(
+            select([table.c.version, table.c[self.delta_column],
+                    table.c.delta])
+            .where(and_(self.version_key == id,
+                        table.c.version >= (base or min(versions)),
+                        table.c.version <= max(versions)))
+            .order_by(*self.version_order)
+        )
+
+        result = {}
+        value, restored = None, False
+        for version, stored, delta in rows:
+            if delta is None:
+                value, restored = stored, True
+            elif not restored:
+                raise BrokenVersionChain(
+                    "Version %s of %s has no snapshot before it"
+                    % (version, id)
+                )
+            else:
+                value = apply_delta(value or "", delta)
+            if version in versions:
+                result[version] = value
+
+        return result
+
+    def _latest(self, connection, ids):
+        """
+        Restores values of the latest versions of objects.
+
+        :return: Dict id -> (value, delta_depth, version)
+        """
+        table = self.versions_table
+        base = (
+            select([self.version_key.label("id"),
+                    func.max(table.c.version).label("version")])
+            .where(and_(self.version_key.in_(ids), table.c.delta.is_(None)))
+            .group_by(self.version_key)
+            .alias("base")
+        )
+
+        rows = connection.execute(
+            select([self.version_key, table.c.version,
+                    table.c[self.delta_column], table.c.delta,
+                    table.c.delta_depth])
+            .select_from(table.join(base, and_(
+                self.version_key == base.c.id,
+                table.c.version >= base.c.version,
+            )))
+            .order_by(self.version_key, *self.version_order)
+        )
+
+        result = {}
+        for id, version, stored, delta, depth in rows:
+            if delta is None:
+                value = stored
+            elif id not in result:
+                raise BrokenVersionChain(
+                    "Version %s of %s has no snapshot before it"
+                    % (version, id)
+                )
+            else:
+                value = apply_delta(result[id][0] or "", delta)
+            result[id] = (value, depth, version)
+
+        return result
+
+    def _after_flush(self, session, flush_context):
+        ids = [
+            getattr(obj, self._id_attr) for obj in session.new
+            if isinstance(obj, self.entity)
+        ]
+        ids.extend(
+            getattr(obj, self._id_attr) for obj in session.dirty
+            if isinstance(obj, self.entity) and self._changed(obj)
+        )
+
+        self.write(session.connection(), ids)
+
+    def changed(self, obj):
+        """
+        Whether a flush of a persistent obj writes a new version
+        """
+        return self._changed(obj)
+
+    def _changed(self, obj):
+        attrs = inspect(obj).attrs
+        return any(attrs[key].history.has_changes()
+                   for key in self._tracked_attrs)
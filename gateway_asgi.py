@@ -0,0 +1,290 @@
+"""
+    Асинхронная (ASGI) точка входа API RPC сервера gateway.
+
+    Обрабатывает те же методы jsonrpcserver, что и gateway_server.py, но
+    не держит поток на каждое соединение: блокирующие вызовы выполняются
+    в ограниченных пулах потоков, отдельно для базы данных, процессора и
+    ожидания task.watch.
+
+    Состояние задачи процессора передаётся потоком server-sent events
+    по адресу GET /tasks/<task_id>/events.
+
+    Запуск:
+
+        uvicorn gateway_asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from jsonrpcserver.methods import Methods
+from jsonrpcserver.methods import global_methods as methods
+
+import settings
+from api_world import ApiWorld
+from components_utils.processor_client import processor, task_watcher
+from nlab.db import create_sessionmaker
+from nlab.rpc import (EXECUTOR_DB, EXECUTOR_PROCESSOR, EXECUTOR_WATCH,
+                      get_rpc_executor)
+from nlab.rpc.dispatcher import Dispatcher
+from nlab.rpc.exceptions import ApiError
+
+HOST = '0.0.0.0'
+PORT = int(settings.GATEWAY_PORT)
+POSTGRES_PREFIX = settings.POSTGRES_ENV_PREFIX
+TASK_EVENTS_PATH = re.compile(r"^/tasks/([^/]+)/events$")
+
+logger = logging.getLogger(__name__)
+
+
+class AsgiGateway:
+    """
+        ASGI приложение, диспетчеризующее JSON-RPC запросы в пулы потоков.
+    """
+    def __init__(self, methods: Methods, *, pg_prefix=POSTGRES_PREFIX,
+                 db_workers=settings.GATEWAY_DB_WORKERS,
+                 processor_workers=settings.GATEWAY_PROCESSOR_WORKERS,
+                 watch_workers=settings.TASK_WATCH_MAX_WAITERS):
+        self.methods = methods
+        self.pg_prefix = pg_prefix
+        self.api = None
+        self.dispatcher = Dispatcher(
+            methods,
+            workers=settings.GATEWAY_BATCH_WORKERS,
+            max_concurrency=settings.GATEWAY_BATCH_CONCURRENCY,
+            member_timeout=settings.GATEWAY_BATCH_MEMBER_TIMEOUT,
+        )
+        self.executors = {
+            EXECUTOR_DB: ThreadPoolExecutor(
+                max_workers=db_workers, thread_name_prefix="gateway-db"
+            ),
+            EXECUTOR_PROCESSOR: ThreadPoolExecutor(
+                max_workers=processor_workers,
+                thread_name_prefix="gateway-processor"
+            ),
+            EXECUTOR_WATCH: ThreadPoolExecutor(
+                max_workers=watch_workers, thread_name_prefix="gateway-watch"
+            ),
+        }
+
+    def startup(self):
+        if self.api is not None:
+            return
+
+        sessionmaker = create_sessionmaker(env_prefix=self.pg_prefix)
+        self.api = ApiWorld(sessionmaker)
+        self.api.install(self.methods)
+
+    def shutdown(self):
+        self.dispatcher.shutdown()
+        for executor in self.executors.values():
+            executor.shutdown(wait=False)
+        processor.close()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+
+        if scope["type"] != "http":
+            return
+
+        task_events = TASK_EVENTS_PATH.match(scope["path"])
+        if task_events is not None and scope["method"] == "GET":
+            await self._send_task_events(scope, receive, send,
+                                         task_events.group(1))
+            return
+
+        if scope["path"] != "/":
+            await _send_response(send, 404, b"")
+            return
+
+        if scope["method"] != "POST":
+            await _send_response(send, 405, b"")
+            return
+
+        self.startup()
+
+        request = (await _read_body(receive)).decode()
+
+        status, body = await self.dispatcher.dispatch_async(
+            request, executor_for=self._executor_for
+        )
+        if isinstance(body, bytes):
+            await _send_response(send, status, body)
+        else:
+            await self._send_stream(send, status, body)
+
+    async def _send_stream(self, send, status, chunks):
+        """
+            Потоковый ответ: части тела читаются из базы в пуле потоков
+            и отправляются клиенту по мере готовности.
+        """
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")],
+        })
+
+        loop = asyncio.get_event_loop()
+        executor = self.executors[EXECUTOR_DB]
+        try:
+            while True:
+                chunk = await loop.run_in_executor(
+                    executor, next, chunks, None
+                )
+                if chunk is None:
+                    break
+
+                await send({
+                    "type": "http.response.body", "body": chunk,
+                    "more_body": True,
+                })
+        except Exception:
+            logger.exception("Error in streaming response")
+            raise
+        finally:
+            await loop.run_in_executor(executor, chunks.close)
+
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _send_task_events(self, scope, receive, send, task_id):
+        """
+            Состояние задачи потоком server-sent events: событие task при
+            каждом изменении (id события - версия, данные - как у
+            task.watch) и комментарий, если состояние не менялось
+            TASK_WATCH_MAX_WAIT секунд. Ошибка процессора передаётся
+            событием error, после которого поток завершается. Клиент,
+            переподключившийся с Last-Event-ID, получает только изменения.
+        """
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+            ],
+        })
+
+        version = _last_event_id(scope)
+        disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+        try:
+            while True:
+                changed = asyncio.ensure_future(task_watcher.wait_async(
+                    task_id, version, settings.TASK_WATCH_MAX_WAIT
+                ))
+                await asyncio.wait({changed, disconnected},
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    changed.cancel()
+                    return
+
+                try:
+                    new_version, result = changed.result()
+                except ApiError as e:
+                    await _send_event(send, "error", None, e.errors)
+                    break
+
+                if result is None or new_version == version:
+                    await send({
+                        "type": "http.response.body", "body": b": ping\n\n",
+                        "more_body": True,
+                    })
+                    continue
+
+                version = new_version
+                if not result["status"]:
+                    await _send_event(send, "error", version,
+                                      result["errors"])
+                    break
+
+                await _send_event(send, "task", version, {
+                    "version": version, "info": result["response"],
+                })
+        finally:
+            disconnected.cancel()
+
+        await send({"type": "http.response.body", "body": b""})
+
+    def _executor_for(self, method_name):
+        """
+            Пул потоков для метода: проксируемые на процессор методы и
+            ожидание task.watch выполняются отдельно от методов, работающих
+            с базой данных.
+            Для неизвестных методов ошибку формирует jsonrpcserver.
+        """
+        method = self.methods.items.get(method_name)
+        if method is None:
+            return self.executors[EXECUTOR_DB]
+
+        return self.executors[get_rpc_executor(method)]
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.startup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+async def _read_body(receive):
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+
+    return b"".join(chunks)
+
+
+async def _send_response(send, status, body):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json")],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _send_event(send, event, event_id, data):
+    lines = ["event: %s" % event]
+    if event_id is not None:
+        lines.append("id: %s" % event_id)
+    lines.append("data: %s" % json.dumps(data, ensure_ascii=False))
+    await send({
+        "type": "http.response.body",
+        "body": ("\n".join(lines) + "\n\n").encode("utf-8"),
+        "more_body": True,
+    })
+
+
+def _last_event_id(scope):
+    for name, value in scope["headers"]:
+        if name == b"last-event-id":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+
+    return None
+
+
+app = AsgiGateway(methods)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=HOST, port=PORT)
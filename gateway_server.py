@@ -6,13 +6,13 @@ from typing import Tuple
 from flask import Flask
 from flask import Response as FlaskResponse
 from flask import request as flask_request
-from jsonrpcserver import dispatch
 from jsonrpcserver.methods import global_methods as methods
 from sqlalchemy.engine.base import Engine
 
 import settings
 from api_world import ApiWorld
 from nlab.db import create_sessionmaker
+from nlab.rpc.dispatcher import Dispatcher
 
 HOST = '0.0.0.0'
 PORT = settings.GATEWAY_PORT
@@ -20,6 +20,13 @@ POSTGRES_PREFIX = settings.POSTGRES_ENV_PREFIX
 
 app = Flask(__name__)
 
+dispatcher = Dispatcher(
+    methods,
+    workers=settings.GATEWAY_BATCH_WORKERS,
+    max_concurrency=settings.GATEWAY_BATCH_CONCURRENCY,
+    member_timeout=settings.GATEWAY_BATCH_MEMBER_TIMEOUT,
+)
+
 
 @app.route("/", methods=["POST"])
 def index():
@@ -28,12 +35,8 @@ def index():
     """
     request = flask_request.get_data().decode()
 
-    response = dispatch(
-        request=request, methods=methods, debug=True, basic_logging=True
-    )
-    return FlaskResponse(
-        str(response), response.http_status, mimetype="application/json"
-    )
+    status, body = dispatcher.dispatch(request)
+    return FlaskResponse(body, status, mimetype="application/json")
 
 
 def get_server_params(app=app, pg_prefix=POSTGRES_PREFIX,
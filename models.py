@@ -1,10 +1,8 @@
-import random
-from datetime import datetime, timedelta
-
-from sqlalchemy.event import listens_for
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
+import settings
+from components_utils.version_history import VersionHistory
 from tables import (access_complect_account_table,
                     access_profile_account_table, access_profile_user_table,
                     access_user_flags_table, complects_table,
@@ -37,6 +35,12 @@ class Profile(Base):
     is_enabled = profiles_table.c.is_enabled
     engine_id = profiles_table.c.engine_id
 
+    # Атрибуты, нужные для полей to_dict с другими именами (см. fields
+    # в VersionObject.prepare_filter_q)
+    FIELD_ATTRS = {
+        "id": ("profile_id",),
+    }
+
     def to_dict(self):
         return {
             "id": self.profile_id,
@@ -63,6 +67,11 @@ class Suite(Base):
     is_enabled = suites_table.c.is_enabled
     hidden = suites_table.c.hidden
 
+    FIELD_ATTRS = {
+        "id": ("suite_id",),
+        "updated": ("updated", "created"),
+    }
+
     def to_dict(self):
         return {
             "id": self.suite_id,
@@ -92,6 +101,14 @@ class Template(Base):
 
     suite = relationship("Suite", lazy="joined")
 
+    FIELD_ATTRS = {
+        "id": ("template_id",),
+        "updated": ("updated", "created"),
+        "profile_id": ("suite",),
+        "suite_title": ("suite",),
+        "template_title": ("meta",),
+    }
+
     def to_dict(self):
         res = {
             "id": self.template_id,
@@ -105,28 +122,12 @@ class Template(Base):
             "state": self.state,
             "profile_id": self.suite.profile_id if self.suite else None,
             "meta": self.meta,
-            "stats": self.extract_stats(),
             "suite_title": self.suite.title if self.suite else None,
             "template_title": self.meta.get("title") if self.meta else None,
         }
 
         return res
 
-    def extract_stats(self):
-        # For debug now
-        used_7d = random.randint(0, 2)
-
-        last_used = datetime.now() - timedelta(days=random.uniform(1, 60))
-        if used_7d:
-            last_used = datetime.now() - timedelta(days=random.uniform(1, 7))
-
-        res = {
-            "last_used": last_used,
-            "used_7d": used_7d,
-            "used_30d": random.randint(0, 2) + used_7d,
-        }
-        return res
-
 
 class Dictionary(Base):
     __table__ = dictionaries_table
@@ -147,6 +148,18 @@ class Dictionary(Base):
     is_enabled = dictionaries_table.c.is_enabled
     parts = dictionaries_table.c.parts
 
+    FIELD_ATTRS = {
+        "id": ("dictionary_id",),
+        "updated": ("updated", "created"),
+    }
+
+    # Поля to_short_dict
+    SHORT_FIELDS = (
+        "id", "created", "updated", "state", "kind", "code", "description",
+        "common", "hidden", "meta", "profile_ids", "is_enabled", "version",
+        "parts",
+    )
+
     def to_dict(self):
         res = {
             "id": self.dictionary_id,
@@ -206,8 +219,26 @@ class DictionaryVersion(Base):
     profile_ids = dictionaries_versions_table.c.profile_ids
     is_enabled = dictionaries_versions_table.c.is_enabled
     parts = dictionaries_versions_table.c.parts
+    delta = dictionaries_versions_table.c.delta
+    delta_depth = dictionaries_versions_table.c.delta_depth
+    content_size = dictionaries_versions_table.c.content_size
+    content_hash = dictionaries_versions_table.c.content_hash
+
+    # Поля to_meta_dict, загружаются через load_only
+    META_FIELDS = (
+        "version_id", "dictionary_id", "created", "updated", "state", "kind",
+        "code", "description", "common", "hidden", "meta", "profile_ids",
+        "is_enabled", "version", "parts", "content_size", "content_hash",
+    )
 
     def to_dict(self):
+        # content версии, хранящейся разницей, равен None и
+        # восстанавливается через dictionary_history.contents
+        res = self.to_meta_dict()
+        res["content"] = self.content
+        return res
+
+    def to_meta_dict(self):
         return {
             "version_id": self.version_id,
             "id": self.dictionary_id,
@@ -217,7 +248,6 @@ class DictionaryVersion(Base):
             "kind": self.kind,
             "code": self.code,
             "description": self.description,
-            "content": self.content,
             "common": self.common,
             "hidden": self.hidden,
             "meta": self.meta,
@@ -225,33 +255,17 @@ class DictionaryVersion(Base):
             "is_enabled": self.is_enabled,
             "version": self.version,
             "parts": self.parts,
+            "content_size": self.content_size,
+            "content_hash": self.content_hash,
         }
 
 
-@listens_for(Dictionary, 'after_insert')
-@listens_for(Dictionary, 'after_update')
-def task_after_update_function(mapper, connection, target):
-
-    table = DictionaryVersion.__table__
-    connection.execute(
-        table.insert().values(
-            id=target.dictionary_id,
-            created=target.created,
-            updated=target.updated,
-            version=target.version,
-            state=target.state,
-            kind=target.kind,
-            title=target.code,
-            description=target.description,
-            content=target.content,
-            common=target.common,
-            hidden=target.hidden,
-            meta=target.meta,
-            profile_ids=target.profile_ids,
-            is_enabled=target.is_enabled,
-            parts=target.parts,
-        )
-    )
+# Версии словарей пишутся пачкой после каждого flush, обработчик
+# подключается к sessionmaker сервиса в ApiWorld
+dictionary_history = VersionHistory(
+    Dictionary, dictionaries_versions_table, delta_column="content",
+    snapshot_interval=settings.DICTIONARY_SNAPSHOT_INTERVAL,
+)
 
 
 class Complect(Base):
@@ -270,6 +284,11 @@ class Complect(Base):
     debug_target = complects_table.c.debug_target
     deploy_target = complects_table.c.deploy_target
 
+    FIELD_ATTRS = {
+        "id": ("complect_id",),
+        "updated": ("updated", "created"),
+    }
+
     def to_dict(self):
         res = {
             "id": self.complect_id,
@@ -304,6 +323,13 @@ class Testcase(Base):
     is_common = testcase_table.c.is_common
     author = testcase_table.c.author
 
+    FIELD_ATTRS = {
+        "id": ("testcase_id",),
+    }
+
+    # Поля to_short_dict
+    SHORT_FIELDS = ("id", "replicas")
+
     def to_dict(self):
         res = {
             "id": self.testcase_id,
@@ -0,0 +1,155 @@
+"""
+Кэш редко меняющихся данных с ограниченным временем жизни.
+
+Значение свежее ttl секунд после загрузки. Ещё stale_ttl секунд
+устаревшее значение возвращается сразу, а новое загружается в фоновом
+потоке. Если значения нет или оно устарело больше, вызов ждёт загрузки.
+Одновременные загрузки одного ключа объединяются в одну: остальные
+вызовы ждут её результата. Ошибки загрузки не кэшируются.
+
+При ttl = 0 значения не хранятся, остаётся только объединение загрузок.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+log = logging.getLogger(__name__)
+
+
+class TtlCache:
+    def __init__(self, load, *, ttl, stale_ttl=0.0, max_entries=None,
+                 name=None):
+        """
+        :param load: Функция загрузки значения по ключу
+        :param ttl: Сколько секунд значение считается свежим
+        :param stale_ttl: Сколько секунд после этого возвращается
+            устаревшее значение, пока загружается новое
+        :param max_entries: Ограничение числа значений, при превышении
+            удаляются просроченные, затем самые старые
+        """
+        self.load = load
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.name = name or getattr(load, "__name__", "cache")
+
+        self._entries = {}
+        self._loading = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, loaded_at = entry
+                age = now - loaded_at
+                if age < self.ttl:
+                    self.hits += 1
+                    return value
+
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    if key not in self._loading:
+                        self._start_load(key, background=True)
+                    return value
+
+            self.misses += 1
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                future = self._start_load(key, background=False)
+                generation = self._generation
+
+        if owner:
+            self._load(key, future, generation)
+
+        return future.result()
+
+    def invalidate(self, key=None):
+        """
+        Удаление значения. Загрузки, начатые до вызова, не сохраняют
+        результат в кэш.
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+            self._loading.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._loading.clear()
+
+    def status(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_age": max(
+                    (now - loaded_at for _, loaded_at in
+                     self._entries.values()),
+                    default=None,
+                ),
+                "loading": len(self._loading),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+            }
+
+    def _start_load(self, key, *, background):
+        future = Future()
+        self._loading[key] = future
+        if background:
+            threading.Thread(
+                target=self._refresh, args=(key, future, self._generation),
+                name="%s-refresh" % self.name, daemon=True,
+            ).start()
+        return future
+
+    def _refresh(self, key, future, generation):
+        self._load(key, future, generation)
+        if future.exception() is not None:
+            log.error("Refresh of %s failed: %s", self.name,
+                      future.exception())
+
+    def _load(self, key, future, generation):
+        try:
+            value = self.load(key)
+        except Exception as e:
+            with self._lock:
+                if self._loading.get(key) is future:
+                    del self._loading[key]
+            future.set_exception(e)
+            return
+
+        with self._lock:
+            if self._loading.get(key) is future:
+                del self._loading[key]
+            if generation == self._generation and \
+                    self.ttl + self.stale_ttl > 0:
+                self._entries.pop(key, None)
+                self._entries[key] = (value, time.monotonic())
+                self._evict()
+
+        future.set_result(value)
+
+    def _evict(self):
+        if self.max_entries is None or \
+                len(self._entries) <= self.max_entries:
+            return
+
+        expire_before = time.monotonic() - self.ttl - self.stale_ttl
+        for key, (_, loaded_at) in list(self._entries.items()):
+            if loaded_at <= expire_before:
+                del self._entries[key]
+
+        # Значения добавляются в порядке загрузки
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
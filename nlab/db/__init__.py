@@ -1,10 +1,16 @@
 import sqlalchemy as sa
 from nlab.conf import conf_attr
+from sqlalchemy import func, literal
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.expression import ClauseElement
 
 
 def create_engine(env_prefix):
-    engine = sa.create_engine(make_sqla_database_uri(env_prefix=env_prefix))
+    # use_batch_mode: executemany через psycopg2.extras.execute_batch
+    engine = sa.create_engine(make_sqla_database_uri(env_prefix=env_prefix),
+                              use_batch_mode=True)
     return engine
 
 
@@ -41,6 +47,8 @@ def _create_sessionmaker_caller(sessionmaker_):
     def creator():
         return SessionContext(sessionmaker_())
 
+    # Для подключения обработчиков событий сессий
+    creator.sessionmaker = sessionmaker_
     return creator
 
 
@@ -54,3 +62,40 @@ def next_seq_id(name, session):
     result = session.execute("SELECT nextval('%s')" % name)
     row = result.first()
     return row[0]
+
+
+class Explain(Executable, ClauseElement):
+    """
+    EXPLAIN (FORMAT JSON) запроса. Параметры запроса передаются через
+    обычные bind-процессоры диалекта, как при выполнении самого запроса.
+    """
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+# Конфигурация полнотекстового поиска индексов и запросов. После её
+# изменения полнотекстовые индексы нужно пересоздать.
+TS_CONFIG = "simple"
+
+
+def ts_config():
+    # to_tsvector с двумя аргументами неизменяемая и подходит для индексов
+    return literal(TS_CONFIG)
+
+
+def to_tsvector(*columns):
+    """
+    Полнотекстовый документ из колонок, колонки соединяются пробелом.
+    Используется и в индексах tables.py, и в запросах поиска, чтобы
+    планировщик сопоставлял выражения.
+    """
+    document = columns[0]
+    for column in columns[1:]:
+        document = document.op("||")(literal(" ")).op("||")(column)
+
+    return func.to_tsvector(ts_config(), document)
@@ -155,8 +155,8 @@ class LogRequest:
         if body and not isinstance(body, dict):
             body = json.loads(body)
 
-        from nlab.rpc import transform_response
-        return json.dumps(transform_response(body), indent=4, ensure_ascii=False)
+        from nlab.rpc.encoder import json_serial
+        return json.dumps(body, indent=4, ensure_ascii=False, default=json_serial)
 
     @classmethod
     def get_log(cls, r, type="POST"):
@@ -1 +1,3 @@
 from .job import *
+from .client import ProcessorClient, get_client
+from .watcher import TaskWatcher
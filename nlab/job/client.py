@@ -0,0 +1,314 @@
+"""
+Клиент сервиса выполнения задач (процессора).
+
+Запросы выполняются через requests.Session с пулом keep-alive соединений,
+поэтому последовательные вызовы не открывают новое TCP соединение.
+Время соединения и чтения ответа ограничено. Для каждого метода
+процессора считаются число вызовов, ошибок и время ответа.
+
+Вызовы защищены от недоступного процессора (см. nlab.job.resilience):
+число одновременных запросов метода ограничено, после серии отказов
+запросы сразу завершаются ошибкой PROCESSOR_UNAVAILABLE, а идемпотентные
+чтения при отказах повторяются.
+
+Одинаковые одновременные запросы чтения (метод и параметры совпадают)
+выполняются одним запросом к процессору, результат которого получают все
+вызовы и который ещё coalesce_ttl секунд возвращается без запроса.
+Поэтому ответы этих методов нельзя изменять.
+
+Клиенты создаются один раз на адрес процессора, см. get_client.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from nlab.cache import TtlCache
+from nlab.job.resilience import (FAILURE_ERRORS, TRANSPORT_ERRORS, Bulkhead,
+                                 CircuitBreaker, backoff_delay)
+from nlab.rpc.exceptions import ApiError
+
+# Методы только для чтения, которые можно повторять
+RETRY_METHODS = ("task.info", "task.list")
+
+# Методы чтения, одинаковые запросы которых объединяются
+COALESCE_METHODS = ("task.info", "task.list", "complect_revision.list",
+                    "complect_revision.fetch")
+
+
+class MethodMetrics:
+    """
+    Счётчики вызовов одного метода. Квантили считаются по последним
+    window вызовам.
+    """
+    def __init__(self, window=1000):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_time = None
+        self._recent = deque(maxlen=window)
+
+    def add(self, duration, error):
+        self.calls += 1
+        if error:
+            self.errors += 1
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+        self.last_time = duration
+        self._recent.append(duration)
+
+    def as_dict(self):
+        recent = sorted(self._recent)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms":
+                _ms(self.total_time / self.calls) if self.calls else None,
+            "p50_ms": _ms(_quantile(recent, 0.5)),
+            "p95_ms": _ms(_quantile(recent, 0.95)),
+            "max_ms": _ms(self.max_time),
+            "last_ms": _ms(self.last_time),
+        }
+
+
+class ProcessorClient:
+    def __init__(self, url, *, connect_timeout=5.0, read_timeout=60.0,
+                 pool_size=32, headers=None, method_concurrency=8,
+                 bulkhead_timeout=1.0, failure_threshold=5,
+                 reset_timeout=30.0, retries=2, retry_backoff=0.2,
+                 retry_methods=RETRY_METHODS, coalesce_ttl=1.0,
+                 coalesce_methods=COALESCE_METHODS,
+                 coalesce_max_entries=10000):
+        """
+        :param url: Адрес JSON-RPC процессора
+        :param connect_timeout: Ограничение времени соединения в секундах
+        :param read_timeout: Ограничение времени ожидания ответа в секундах
+        :param pool_size: Сколько соединений держится открытыми
+        :param headers: Заголовки всех запросов
+        :param method_concurrency: Сколько запросов одного метода
+            выполняются одновременно
+        :param bulkhead_timeout: Сколько секунд запрос ждёт свободного
+            места, затем завершается ошибкой PROCESSOR_OVERLOADED
+        :param failure_threshold: Число отказов подряд, после которого
+            запросы завершаются ошибкой PROCESSOR_UNAVAILABLE
+        :param reset_timeout: Через сколько секунд после этого выполняется
+            пробный запрос
+        :param retries: Число повторов методов retry_methods при отказе
+        :param retry_backoff: Начальная задержка повтора в секундах
+        :param coalesce_ttl: Сколько секунд ответ методов coalesce_methods
+            возвращается на одинаковые запросы, 0 - только объединение
+            одновременных запросов
+        """
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.retry_methods = frozenset(retry_methods)
+        self.coalesce_methods = frozenset(coalesce_methods)
+        self._coalesced = TtlCache(self._call_coalesced, ttl=coalesce_ttl,
+                                   max_entries=coalesce_max_entries,
+                                   name="processor-reads")
+
+        self.bulkhead = Bulkhead(max_concurrency=method_concurrency,
+                                 timeout=bulkhead_timeout)
+        self.breaker = CircuitBreaker(failure_threshold=failure_threshold,
+                                      reset_timeout=reset_timeout)
+
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              pool_block=False)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def call(self, request_data, headers=None):
+        """
+        Выполнение JSON-RPC запроса
+
+        :return: Ответ процессора
+        """
+        method = request_data.get("method")
+        if method in self.coalesce_methods and headers is None:
+            return self._coalesced.get(json.dumps(
+                [method, request_data.get("params")], sort_keys=True
+            ))
+
+        return self._call_retrying(method, request_data, headers)
+
+    async def call_async(self, request_data, headers=None):
+        """
+        Выполнение запроса без блокировки цикла событий: запрос выполняется
+        в пуле потоков клиента размером с пул соединений.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), self.call, request_data, headers
+        )
+
+    def metrics(self):
+        """
+        :return: Счётчики и время ответа по методам процессора, состояние
+            защиты от отказов
+        """
+        with self._lock:
+            methods = {
+                method: metrics.as_dict()
+                for method, metrics in self._metrics.items()
+            }
+
+        return {
+            "methods": methods,
+            "circuit": self.breaker.status(),
+            "in_flight": self.bulkhead.status(),
+            "coalesced": self._coalesced.status(),
+        }
+
+    def close(self):
+        self.session.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _call_retrying(self, method, request_data, headers):
+        attempts = 1
+        if method in self.retry_methods:
+            attempts += self.retries
+
+        for attempt in range(attempts):
+            try:
+                return self._call_once(method, request_data, headers)
+            except ApiError as e:
+                if e.code not in TRANSPORT_ERRORS or attempt + 1 == attempts:
+                    raise
+
+            time.sleep(backoff_delay(attempt, self.retry_backoff,
+                                     self.timeout[1]))
+
+    def _call_coalesced(self, key):
+        method, params = json.loads(key)
+        request_data = {
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": params,
+            "id": 1,
+        }
+        return self._call_retrying(method, request_data, None)
+
+    def _call_once(self, method, request_data, headers):
+        probe = self.breaker.before_call()
+        try:
+            self.bulkhead.acquire(method)
+        except ApiError:
+            if probe:
+                self.breaker.cancel_probe()
+            raise
+
+        started = time.monotonic()
+        error = True
+        try:
+            response = self._post(request_data, headers)
+            error = _is_error(response)
+        except ApiError as e:
+            if e.code in FAILURE_ERRORS:
+                self.breaker.on_failure(probe)
+            else:
+                self.breaker.on_success(probe)
+            raise
+        except Exception:
+            # Иначе пробный запрос остался бы незавершённым навсегда
+            self.breaker.on_failure(probe)
+            raise
+        else:
+            self.breaker.on_success(probe)
+        finally:
+            self.bulkhead.release(method)
+            self._add_metrics(method, time.monotonic() - started, error)
+
+        return response
+
+    def _post(self, request_data, headers):
+        try:
+            res = self.session.post(self.url, json=request_data,
+                                    headers=headers, timeout=self.timeout)
+        except requests.exceptions.HTTPError as errh:
+            raise ApiError(code="PROCESSOR_HTTP_ERROR", message=errh)
+        except requests.exceptions.ConnectionError as errc:
+            raise ApiError(code="PROCESSOR_CONNECTING_ERROR", message=errc)
+        except requests.exceptions.Timeout as errt:
+            raise ApiError(code="PROCESSOR_TIMEOUT_ERROR", message=errt)
+        except requests.exceptions.RequestException as err:
+            raise ApiError(code="PROCESSOR_REQUEST_ERROR", message=err)
+
+        if res.status_code >= 500:
+            raise ApiError(
+                code="PROCESSOR_HTTP_ERROR",
+                message="Processor error, HTTP status %d" % res.status_code,
+            )
+
+        try:
+            return res.json()
+        except ValueError:
+            raise ApiError(
+                code="PROCESSOR_HTTP_ERROR",
+                message="Invalid processor response, HTTP status %d"
+                        % res.status_code,
+            )
+
+    def _add_metrics(self, method, duration, error):
+        with self._lock:
+            metrics = self._metrics.get(method)
+            if metrics is None:
+                metrics = self._metrics[method] = MethodMetrics()
+            metrics.add(duration, error)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.pool_size,
+                    thread_name_prefix="processor-client",
+                )
+            return self._executor
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(url, **options):
+    """
+    Общий клиент процессора по адресу url. Параметры options (см.
+    ProcessorClient) используются при первом обращении.
+    """
+    with _clients_lock:
+        client = _clients.get(url)
+        if client is None:
+            client = _clients[url] = ProcessorClient(url, **options)
+        return client
+
+
+def _is_error(response):
+    result = response.get("result") if isinstance(response, dict) else None
+    return not isinstance(result, dict) or not result.get("status")
+
+
+def _quantile(values, q):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
@@ -1,23 +1,12 @@
-import requests
-from nlab.rpc.exceptions import ApiError
+from nlab.job.client import get_client
 
 
 def post_request(url, headers, request_data):
     """
-    Выполнение POST запроса
+    Выполнение POST запроса через общий клиент процессора, см.
+    nlab.job.client
     """
-    try:
-        res = requests.post(url, json=request_data, headers=headers)
-    except requests.exceptions.HTTPError as errh:
-        raise ApiError(code="PROCESSOR_HTTP_ERROR", message=errh)
-    except requests.exceptions.ConnectionError as errc:
-        raise ApiError(code="PROCESSOR_CONNECTING_ERROR", message=errc)
-    except requests.exceptions.Timeout as errt:
-        raise ApiError(code="PROCESSOR_TIMEOUT_ERROR", message=errt)
-    except requests.exceptions.RequestException as err:
-        raise ApiError(code="PROCESSOR_REQUEST_ERROR", message=err)
-
-    return res.json()
+    return get_client(url).call(request_data, headers=headers)
 
 
 def get_create_request(method, script, type, extra=None, args=None):
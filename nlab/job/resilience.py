@@ -0,0 +1,143 @@
+"""
+Защита от медленного или недоступного процессора.
+
+Bulkhead ограничивает число одновременных запросов каждого метода, чтобы
+зависшие вызовы одного метода не занимали все потоки сервера.
+CircuitBreaker после нескольких подряд отказов соединения, превышений
+времени ответа, ответов 5xx или ответов, которые не разбираются, сразу
+отвечает ошибкой PROCESSOR_UNAVAILABLE, а через reset_timeout пропускает
+один пробный запрос.
+"""
+import random
+import threading
+import time
+
+from nlab.rpc.exceptions import ApiError
+
+# Ошибки, при которых процессор считается недоступным
+TRANSPORT_ERRORS = ("PROCESSOR_CONNECTING_ERROR", "PROCESSOR_TIMEOUT_ERROR")
+
+# Ошибки, которые считаются отказами CircuitBreaker
+FAILURE_ERRORS = TRANSPORT_ERRORS + ("PROCESSOR_HTTP_ERROR",)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class Bulkhead:
+    def __init__(self, *, max_concurrency, timeout):
+        """
+        :param max_concurrency: Сколько запросов одного метода выполняются
+            одновременно
+        :param timeout: Сколько секунд ждать освобождения места
+        """
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._semaphores = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, method):
+        with self._lock:
+            semaphore = self._semaphores.get(method)
+            if semaphore is None:
+                semaphore = self._semaphores[method] = \
+                    threading.BoundedSemaphore(self.max_concurrency)
+
+        if not semaphore.acquire(timeout=self.timeout):
+            raise ApiError(
+                code="PROCESSOR_OVERLOADED",
+                message="Too many concurrent %s requests to processor"
+                        % method,
+            )
+
+        with self._lock:
+            self._in_flight[method] = self._in_flight.get(method, 0) + 1
+
+    def release(self, method):
+        with self._lock:
+            self._in_flight[method] -= 1
+            semaphore = self._semaphores[method]
+        semaphore.release()
+
+    def status(self):
+        with self._lock:
+            return {
+                method: count
+                for method, count in self._in_flight.items() if count
+            }
+
+
+class CircuitBreaker:
+    def __init__(self, *, failure_threshold, reset_timeout):
+        """
+        :param failure_threshold: Число отказов подряд, после которого
+            запросы не выполняются
+        :param reset_timeout: Через сколько секунд выполняется пробный
+            запрос
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        :return: True, если запрос пробный
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+
+            if self.state == OPEN and \
+                    time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+
+        raise ApiError(
+            code="PROCESSOR_UNAVAILABLE",
+            message="Processor is unavailable, retry later",
+        )
+
+    def on_success(self, probe):
+        with self._lock:
+            if probe:
+                self._probing = False
+            self.state = CLOSED
+            self._failures = 0
+
+    def cancel_probe(self):
+        """
+        Пробный запрос не был выполнен, пробным станет следующий
+        """
+        with self._lock:
+            self._probing = False
+
+    def on_failure(self, probe):
+        with self._lock:
+            if probe:
+                self._probing = False
+            self._failures += 1
+            if probe or self._failures >= self.failure_threshold:
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+    def status(self):
+        with self._lock:
+            return {"state": self.state, "failures": self._failures}
+
+
+def backoff_delay(attempt, base, cap):
+    """
+    Задержка перед повтором с "полным" случайным разбросом, чтобы повторы
+    разных клиентов не совпадали по времени
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,238 @@
+"""
+Подписка на изменения состояния задач процессора.
+
+Один поток-планировщик опрашивает task.info каждой задачи, которую ждёт
+хотя бы один клиент, раз в poll_interval секунд. Запросы к процессору
+выполняются в пуле из fetch_workers потоков. Изменившийся ответ получает
+номер версии и сразу передаётся всем ждущим клиентам. Опрос задачи
+прекращается, если её никто не ждёт idle_timeout секунд.
+
+Блокирующее ожидание (wait) занимает поток вызывающего, поэтому число
+таких ожиданий ограничено max_waiters. Ожидание в цикле событий
+(wait_async) поток не занимает и не ограничивается.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from nlab.job.job import get_info_request
+from nlab.rpc.exceptions import ApiError
+
+log = logging.getLogger(__name__)
+
+
+class _Watch:
+    def __init__(self, lock):
+        self.version = 0
+        self.result = None
+        self.condition = threading.Condition(lock)
+        self.waiters = 0
+        self.listeners = set()
+        self.last_access = time.monotonic()
+        # Новая задача опрашивается сразу
+        self.next_poll = 0.0
+
+    def is_ready(self, version):
+        return self.version and self.version != version
+
+
+class TaskWatcher:
+    def __init__(self, client, *, poll_interval=1.0, idle_timeout=60.0,
+                 max_tasks=1000, max_waiters=16, fetch_workers=4):
+        """
+        :param client: ProcessorClient
+        :param poll_interval: Период опроса задачи в секундах
+        :param idle_timeout: Через сколько секунд без клиентов опрос задачи
+            прекращается
+        :param max_tasks: Ограничение числа одновременно опрашиваемых задач
+        :param max_waiters: Ограничение числа одновременных блокирующих
+            ожиданий wait, сверх него wait завершается ошибкой OVERLOADED
+        :param fetch_workers: Сколько запросов task.info выполняются
+            одновременно
+        """
+        self.client = client
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.max_tasks = max_tasks
+        self.max_waiters = max_waiters
+        self.fetch_workers = fetch_workers
+
+        self._watches = {}
+        self._waiters = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._executor = None
+
+    def wait(self, task_id, version=None, timeout=None):
+        """
+        Ожидание состояния задачи с версией, отличной от version.
+
+        :return: Версия и ответ task.info ({"status", "response", "errors"}),
+            по истечении timeout - текущие
+        """
+        with self._lock:
+            if self._waiters >= self.max_waiters:
+                raise ApiError(
+                    code="OVERLOADED",
+                    message="Too many task watchers, retry later",
+                )
+
+            watch = self._subscribe(task_id)
+            watch.waiters += 1
+            self._waiters += 1
+            try:
+                watch.condition.wait_for(
+                    lambda: watch.is_ready(version), timeout
+                )
+            finally:
+                watch.waiters -= 1
+                self._waiters -= 1
+                watch.last_access = time.monotonic()
+
+            return watch.version, watch.result
+
+    async def wait_async(self, task_id, version=None, timeout=None):
+        """
+        То же, что wait, без блокировки цикла событий
+        """
+        loop = asyncio.get_event_loop()
+        changed = asyncio.Event()
+
+        def listener():
+            loop.call_soon_threadsafe(changed.set)
+
+        with self._lock:
+            watch = self._subscribe(task_id)
+            watch.listeners.add(listener)
+            ready = watch.is_ready(version)
+
+        try:
+            if not ready:
+                await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                watch.listeners.discard(listener)
+                watch.last_access = time.monotonic()
+
+        with self._lock:
+            return watch.version, watch.result
+
+    def status(self):
+        with self._lock:
+            return {
+                "tasks": len(self._watches),
+                "waiters": sum(watch.waiters + len(watch.listeners)
+                               for watch in self._watches.values()),
+            }
+
+    def _subscribe(self, task_id):
+        watch = self._watches.get(task_id)
+        if watch is not None:
+            return watch
+
+        if len(self._watches) >= self.max_tasks:
+            raise ApiError(
+                code="OVERLOADED",
+                message="Too many watched tasks, retry later",
+            )
+
+        watch = self._watches[task_id] = _Watch(self._lock)
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.fetch_workers,
+                thread_name_prefix="task-watch-fetch",
+            )
+            self._thread = threading.Thread(
+                target=self._run, name="task-watch", daemon=True,
+            )
+            self._thread.start()
+
+        self._wakeup.set()
+        return watch
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                delay = self._poll()
+            except Exception:
+                log.exception("Task watch poll failed")
+                delay = self.poll_interval
+
+            self._wakeup.wait(delay)
+
+    def _poll(self):
+        """
+        Опрос задач, для которых подошло время
+
+        :return: Через сколько секунд нужен следующий опрос, None - когда
+            появится задача
+        """
+        now = time.monotonic()
+        with self._lock:
+            due = [task_id for task_id, watch in self._watches.items()
+                   if watch.next_poll <= now]
+
+        results = zip(due, self._executor.map(self._fetch, due))
+
+        listeners = []
+        with self._lock:
+            now = time.monotonic()
+            for task_id, result in results:
+                watch = self._watches.get(task_id)
+                if watch is None:
+                    continue
+
+                watch.next_poll = now + self.poll_interval
+                if result != watch.result:
+                    watch.result = result
+                    watch.version += 1
+                    watch.condition.notify_all()
+                    listeners.extend(watch.listeners)
+
+                idle = now - watch.last_access
+                if not watch.waiters and not watch.listeners and \
+                        idle >= self.idle_timeout:
+                    del self._watches[task_id]
+
+            next_poll = min((watch.next_poll
+                             for watch in self._watches.values()),
+                            default=None)
+
+        for listener in listeners:
+            listener()
+
+        if next_poll is None:
+            return None
+        return max(next_poll - time.monotonic(), 0)
+
+    def _fetch(self, task_id):
+        try:
+            response = self.client.call(
+                get_info_request(method="task.info", task_id=task_id)
+            )
+        except ApiError as e:
+            return {"status": False, "errors": e.errors}
+        except Exception as e:
+            log.exception("Task %s watch failed", task_id)
+            return {
+                "status": False,
+                "errors": {"code": "UNHANDLED", "message": str(e)},
+            }
+
+        result = response.get("result")
+        if not isinstance(result, dict):
+            return {
+                "status": False,
+                "errors": {
+                    "code": "PROCESSOR_SERVICE",
+                    "message": str(response.get("error")),
+                },
+            }
+
+        return result
@@ -1,6 +1,4 @@
 import functools
-import json
-from datetime import datetime, date, timezone
 
 from jsonrpcserver.methods import Methods
 
@@ -12,6 +10,12 @@ from nlab.rpc.exceptions import ApiError
 
 
 _RPC_NAME_ATTR = "_rpc_name"
+_RPC_EXECUTOR_ATTR = "_rpc_executor"
+
+EXECUTOR_DB = "db"
+EXECUTOR_PROCESSOR = "processor"
+# Долгое ожидание (long polling), не занимает пул процессора
+EXECUTOR_WATCH = "watch"
 
 
 def rpc_name(name):
@@ -26,26 +30,24 @@ def rpc_name(name):
     return decorator
 
 
-def _json_serial(obj):
-    if isinstance(obj, datetime):
-        serial = obj.replace(tzinfo=timezone.utc).timestamp()
-        return int(serial)
+def rpc_executor(name):
+    """
+    Помечает метод пулом, на котором его нужно выполнять в асинхронной
+    точке входа. По умолчанию методы работают с базой данных.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def new_func(*args, **kwargs):
+            return func(*args, **kwargs)
 
-    if isinstance(obj, date):
-        DAY = 24 * 60 * 60  # POSIX day in seconds (exact value)
-        timestamp = (obj - date(1970, 1, 1)).days * DAY
-        return timestamp
+        new_func.__dict__[_RPC_EXECUTOR_ATTR] = name
+        return new_func
 
-    raise TypeError("Type %s not serializable" % type(obj))
+    return decorator
 
 
-def transform_response(resp):
-    """
-    Заменяем даты на таймстемпы. Возможно самый короткий
-    код для преобразования. Хотя и затратный.
-    """
-    return json.loads(json.dumps(resp, ensure_ascii=False,
-                             default=_json_serial))
+def get_rpc_executor(method):
+    return getattr(method, _RPC_EXECUTOR_ATTR, EXECUTOR_DB)
 
 
 def _bind_tracer(group):
@@ -57,7 +59,9 @@ def _bind_tracer(group):
                     status = True
                     errors = {}
                     try:
-                        response = transform_response(func(*args, **kwargs))
+                        # Даты заменяются на таймстемпы при кодировании
+                        # ответа, см. nlab.rpc.encoder
+                        response = func(*args, **kwargs)
                     except (ApiError,)  as e:
                         status = False
                         response = {}
@@ -91,21 +91,28 @@ class _WebComponent:
     def list_all(self, **kwargs):
         list_method = getattr(self, "list")
 
-        offset = 0
         LIMIT = 5000
 
-        final_resp = None
+        final_resp = list_method(limit=LIMIT, **kwargs)
+        resp = final_resp
 
-        while True:
-            resp = list_method(offset=offset, limit=LIMIT, **kwargs)
-            if final_resp is None:
-                final_resp = resp
-            else:
+        if "next_cursor" in resp:
+            # Следующие страницы читаются по курсору, total берётся
+            # из первой страницы
+            while resp["next_cursor"]:
+                resp = list_method(
+                    cursor=resp["next_cursor"], limit=LIMIT, **kwargs
+                )
                 final_resp["items"].extend(resp["items"])
-            if len(resp["items"]) < LIMIT:
-                break
 
+            final_resp["next_cursor"] = None
+            return final_resp
+
+        offset = 0
+        while len(resp["items"]) == LIMIT:
             offset += LIMIT
+            resp = list_method(offset=offset, limit=LIMIT, **kwargs)
+            final_resp["items"].extend(resp["items"])
 
         return final_resp
 
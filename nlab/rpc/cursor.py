@@ -0,0 +1,107 @@
+"""
+Курсоры для постраничного чтения по ключу (keyset pagination).
+
+Курсор хранит значения полей сортировки и первичного ключа последней
+отданной строки. Следующая страница выбирается условием "строки после
+этих значений" вместо OFFSET, поэтому глубокие страницы не медленнее
+первой.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from sqlalchemy import and_, false, or_
+
+from nlab.rpc.exceptions import ApiError
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+
+    if isinstance(value, date):
+        return {"$d": value.isoformat()}
+
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "$dt" in value:
+            return datetime.fromisoformat(value["$dt"])
+        if "$d" in value:
+            return date.fromisoformat(value["$d"])
+
+    return value
+
+
+def encode_cursor(keys, values):
+    """
+    :param keys: Описание сортировки, список пар (поле, направление)
+    :param values: Значения полей сортировки последней строки
+    """
+    data = json.dumps({
+        "k": [[field, direction] for field, direction in keys],
+        "v": [_encode_value(value) for value in values],
+    }, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, keys):
+    """
+    Разбор курсора. Сортировка курсора должна совпадать с сортировкой
+    запроса.
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        cursor_keys = [tuple(key) for key in data["k"]]
+        values = [_decode_value(value) for value in data["v"]]
+    except (TypeError, ValueError, KeyError) as e:
+        raise ApiError(code="INVALID_CURSOR",
+                       message="Invalid cursor: %r" % cursor) from e
+
+    if cursor_keys != list(keys) or len(values) != len(keys):
+        raise ApiError(code="INVALID_CURSOR",
+                       message="Cursor doesn't match requested order")
+
+    return values
+
+
+def seek_predicate(columns, directions, values):
+    """
+    Условие "строка идёт после values" для сортировки по columns.
+
+    Лексикографическое сравнение раскрывается в OR из AND, чтобы
+    поддержать разные направления сортировки у полей. NULL учитываются
+    так же, как их сортирует PostgreSQL: последними при ASC и первыми
+    при DESC.
+    """
+    conditions = []
+    for i, (column, direction, value) in enumerate(
+            zip(columns, directions, values)):
+        equal = [_equal(c, v) for c, v in zip(columns[:i], values[:i])]
+        conditions.append(and_(*equal, _after(column, direction, value)))
+
+    return or_(*conditions)
+
+
+def _equal(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def _nullable(column):
+    return getattr(getattr(column, "expression", column), "nullable", True)
+
+
+def _after(column, direction, value):
+    if direction == 1:
+        if value is None:
+            return false()
+        if _nullable(column):
+            return or_(column > value, column.is_(None))
+        return column > value
+
+    if value is None:
+        return column.isnot(None)
+    return column < value
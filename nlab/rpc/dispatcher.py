@@ -0,0 +1,277 @@
+"""
+Диспетчеризация JSON-RPC запросов.
+
+В отличие от jsonrpcserver.dispatch, элементы пакетного (batch) запроса
+выполняются параллельно в пуле потоков, а ответы возвращаются в порядке
+запросов. Число одновременно выполняемых элементов одного пакета и время
+выполнения каждого элемента ограничены. Элемент, превысивший время,
+продолжает занимать поток пула, поэтому, пока таких элементов больше
+max_abandoned, новые элементы пакетов сразу получают ошибку OVERLOADED.
+Так же работает асинхронный вариант dispatch_async, где элементы
+выполняются в пулах executor_for.
+
+Ответ кодируется в JSON один раз, см. nlab.rpc.encoder. Ответ одиночного
+запроса с потоковыми значениями возвращается итератором частей тела.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from json import JSONDecodeError
+from json import loads as deserialize
+
+from jsonrpcserver import status
+from jsonrpcserver.dispatcher import (add_handlers, log_request, log_response,
+                                      remove_handlers, safe_call, schema,
+                                      validate)
+from jsonrpcserver.methods import Methods
+from jsonrpcserver.request import Request
+from jsonrpcserver.response import (BatchResponse, InvalidJSONResponse,
+                                    InvalidJSONRPCResponse,
+                                    NotificationResponse, Response,
+                                    SuccessResponse)
+from jsonschema import ValidationError
+
+from nlab.rpc.encoder import (encode_response, is_streaming,
+                               iter_encode_response)
+
+
+class OrderedBatchResponse(BatchResponse):
+    """
+    Ответ на пакетный запрос, сохраняющий порядок элементов запроса.
+    """
+    def __init__(self, responses, http_status=status.HTTP_OK):
+        Response.__init__(self, http_status=http_status)
+        self.responses = [r for r in responses if r.wanted]
+
+
+class Dispatcher:
+    def __init__(self, methods: Methods, *, workers, max_concurrency,
+                 member_timeout, max_abandoned=None, debug=True,
+                 basic_logging=True):
+        """
+        :param methods: Зарегистрированные RPC методы
+        :param workers: Размер пула для элементов пакетных запросов
+        :param max_concurrency: Сколько элементов одного пакета выполняются
+            одновременно
+        :param member_timeout: Ограничение времени выполнения элемента пакета
+            в секундах
+        :param max_abandoned: Сколько потоков пула могут занимать элементы,
+            превысившие время, по умолчанию половина пула
+        """
+        self.methods = methods
+        self.max_concurrency = max_concurrency
+        self.member_timeout = member_timeout
+        self.max_abandoned = max(workers // 2, 1) if max_abandoned is None \
+            else max_abandoned
+        self._abandoned = set()
+        self._abandoned_lock = threading.Lock()
+        self.debug = debug
+        self.basic_logging = basic_logging
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="rpc-batch"
+        )
+
+    def dispatch(self, request: str):
+        """
+        Синхронная обработка запроса (точка входа Flask).
+
+        :return: HTTP статус и тело ответа (bytes или итератор bytes)
+        """
+        with self._logging(request) as log:
+            calls = self.parse(request)
+            if isinstance(calls, Response):
+                response = calls
+            elif isinstance(calls, list):
+                response = self._call_batch(calls)
+            else:
+                response = self.call(calls)
+
+            log.body = self.encode(response)
+            return response.http_status, log.body
+
+    async def dispatch_async(self, request: str, *, executor_for):
+        """
+        Асинхронная обработка запроса (точка входа ASGI).
+
+        :param executor_for: Функция, возвращающая пул потоков для имени
+            метода. Для кодирования ответа передаётся None.
+        :return: HTTP статус и тело ответа (bytes или итератор bytes)
+        """
+        loop = asyncio.get_event_loop()
+        with self._logging(request) as log:
+            calls = self.parse(request)
+            if isinstance(calls, Response):
+                response = calls
+            elif isinstance(calls, list):
+                semaphore = asyncio.Semaphore(self.max_concurrency)
+                response = OrderedBatchResponse(await asyncio.gather(*(
+                    self._call_limited(call, semaphore, executor_for)
+                    for call in calls
+                )))
+            else:
+                response = await loop.run_in_executor(
+                    executor_for(calls.method), self.call, calls
+                )
+
+            log.body = await loop.run_in_executor(
+                executor_for(None), self.encode, response
+            )
+            return response.http_status, log.body
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+    def parse(self, request: str):
+        """
+        Разбор запроса. Возвращает Request, список Request для пакетного
+        запроса или Response с ошибкой.
+        """
+        try:
+            deserialized = validate(deserialize(request), schema)
+        except JSONDecodeError as exc:
+            return InvalidJSONResponse(data=str(exc), debug=self.debug)
+        except ValidationError:
+            return InvalidJSONRPCResponse(data=None, debug=self.debug)
+
+        if isinstance(deserialized, list):
+            return [Request(**call) for call in deserialized]
+
+        return Request(**deserialized)
+
+    @staticmethod
+    def encode(response: Response):
+        if is_streaming(response):
+            return iter_encode_response(response)
+
+        return encode_response(response)
+
+    def call(self, request: Request) -> Response:
+        return safe_call(request, self.methods, debug=self.debug)
+
+    def _call_batch(self, calls):
+        responses = [None] * len(calls)
+        pending = {}
+        deadlines = {}
+        queue = list(enumerate(calls))
+        queue.reverse()
+
+        while queue or pending:
+            while queue and len(pending) < self.max_concurrency:
+                index, call = queue.pop()
+                if self._is_overloaded():
+                    responses[index] = self._overloaded_response(call)
+                    continue
+
+                future = self._pool.submit(self.call, call)
+                pending[future] = index
+                deadlines[future] = time.monotonic() + self.member_timeout
+
+            if not pending:
+                continue
+
+            timeout = max(min(deadlines.values()) - time.monotonic(), 0)
+            done, _ = wait(pending, timeout=timeout,
+                           return_when=FIRST_COMPLETED)
+
+            for future in done:
+                index = pending.pop(future)
+                del deadlines[future]
+                responses[index] = future.result()
+
+            now = time.monotonic()
+            for future, deadline in list(deadlines.items()):
+                if deadline <= now:
+                    # Поток продолжит работу, но его слот в пакете
+                    # освобождается, а клиент получает ошибку сразу.
+                    if not future.cancel():
+                        self._abandon(future)
+                    index = pending.pop(future)
+                    del deadlines[future]
+                    responses[index] = self._timeout_response(calls[index])
+
+        return OrderedBatchResponse(responses)
+
+    def _abandon(self, future):
+        with self._abandoned_lock:
+            self._abandoned.add(future)
+        future.add_done_callback(self._release_abandoned)
+
+    def _release_abandoned(self, future):
+        with self._abandoned_lock:
+            self._abandoned.discard(future)
+
+    def _is_overloaded(self):
+        with self._abandoned_lock:
+            return len(self._abandoned) >= self.max_abandoned
+
+    async def _call_limited(self, call, semaphore, executor_for):
+        async with semaphore:
+            if self._is_overloaded():
+                return self._overloaded_response(call)
+
+            future = executor_for(call.method).submit(self.call, call)
+            try:
+                return await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(future)),
+                    timeout=self.member_timeout,
+                )
+            except asyncio.TimeoutError:
+                # Как в _call_batch: поток продолжает работу и учитывается
+                # среди брошенных вызовов
+                if not future.cancel():
+                    self._abandon(future)
+                return self._timeout_response(call)
+
+    def _timeout_response(self, call):
+        return _error_response(
+            call, "TIMEOUT", "Batch member %s exceeded %s seconds" % (
+                call.method, self.member_timeout
+            )
+        )
+
+    @staticmethod
+    def _overloaded_response(call):
+        return _error_response(
+            call, "OVERLOADED",
+            "Too many timed out batch members are still running, "
+            "retry later"
+        )
+
+    def _logging(self, request):
+        return _RequestLog(request, basic_logging=self.basic_logging)
+
+
+def _error_response(call, code, message):
+    if call.is_notification:
+        return NotificationResponse()
+
+    return SuccessResponse(result={
+        "status": False,
+        "errors": {"message": message, "code": code},
+    }, id=call.id)
+
+
+class _RequestLog:
+    """
+    Логирование запроса и ответа так же, как это делает jsonrpcserver.dispatch
+    """
+    def __init__(self, request, *, basic_logging):
+        self.request = request
+        self.basic_logging = basic_logging
+        self.body = None
+        self._handlers = None
+
+    def __enter__(self):
+        if self.basic_logging:
+            self._handlers = add_handlers()
+        log_request(self.request)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if isinstance(self.body, bytes):
+            log_response(self.body.decode("utf-8"))
+        elif self.body is not None:
+            log_response("<streaming response>")
+        if self._handlers is not None:
+            remove_handlers(*self._handlers)
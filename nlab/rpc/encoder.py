@@ -0,0 +1,199 @@
+"""
+Кодирование ответов RPC в JSON.
+
+Результат метода сериализуется один раз, сразу в итоговый конверт
+JSON-RPC: даты заменяются на таймстемпы прямо во время кодирования.
+Если установлен orjson, используется он, иначе стандартный json.
+Кодировщик можно заменить через set_encoder.
+
+Ответы с потоковыми значениями (nlab.rpc.stream) кодируются по частям
+функцией iter_encode_response.
+
+Если результат метода не кодируется, вместо ответа этого вызова (или
+элемента пакета) возвращается ошибка UNHANDLED, остальные элементы
+пакета не затрагиваются. Потоковый ответ заменяется ошибкой, только если
+его первая часть ещё не отправлена.
+"""
+import json
+import logging
+from datetime import date, datetime, timezone
+
+from jsonrpcserver.response import NotificationResponse, Response
+
+from nlab.rpc.stream import Deferred, StreamingList, has_stream
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+log = logging.getLogger(__name__)
+
+# orjson.JSONEncodeError наследует TypeError
+ENCODE_ERRORS = (TypeError, ValueError, OverflowError)
+
+
+def json_serial(obj):
+    if isinstance(obj, datetime):
+        serial = obj.replace(tzinfo=timezone.utc).timestamp()
+        return int(serial)
+
+    if isinstance(obj, date):
+        DAY = 24 * 60 * 60  # POSIX day in seconds (exact value)
+        timestamp = (obj - date(1970, 1, 1)).days * DAY
+        return timestamp
+
+    if isinstance(obj, StreamingList):
+        # Поток внутри пакетного ответа кодируется целиком
+        return list(obj)
+
+    if isinstance(obj, Deferred):
+        return obj.resolve()
+
+    raise TypeError("Type %s not serializable" % type(obj))
+
+
+class JsonEncoder:
+    """
+    Кодировщик на стандартном модуле json
+    """
+    def __init__(self, default=json_serial):
+        self._encoder = json.JSONEncoder(
+            ensure_ascii=False, separators=(",", ":"), default=default
+        )
+
+    def encode(self, obj) -> bytes:
+        return self._encoder.encode(obj).encode("utf-8")
+
+
+class OrjsonEncoder:
+    """
+    Кодировщик на orjson. Даты передаются в default, чтобы формат
+    таймстемпов совпадал с JsonEncoder.
+    """
+    def __init__(self, default=json_serial):
+        self._default = default
+        self._option = orjson.OPT_PASSTHROUGH_DATETIME | \
+            orjson.OPT_NON_STR_KEYS
+
+    def encode(self, obj) -> bytes:
+        return orjson.dumps(obj, default=self._default, option=self._option)
+
+
+_encoder = OrjsonEncoder() if orjson is not None else JsonEncoder()
+
+
+def get_encoder():
+    return _encoder
+
+
+def set_encoder(encoder):
+    """
+    Замена кодировщика. Объект должен иметь метод encode(obj) -> bytes.
+    """
+    global _encoder
+    _encoder = encoder
+
+
+def encode_response(response: Response) -> bytes:
+    """
+    Кодирование ответа jsonrpcserver в итоговые байты конверта JSON-RPC
+    """
+    if isinstance(response, NotificationResponse):
+        return b""
+
+    deserialized = response.deserialized()
+    if isinstance(deserialized, list):
+        if not deserialized:
+            # Ответ на пакет из одних уведомлений должен быть пустым
+            return b""
+
+        return b"[" + b",".join(
+            _encode_member(member) for member in deserialized
+        ) + b"]"
+
+    return _encode_member(deserialized)
+
+
+def _encode_member(deserialized):
+    try:
+        return _encoder.encode(deserialized)
+    except ENCODE_ERRORS as e:
+        return _encode_error(deserialized, e)
+
+
+def _encode_error(deserialized, error):
+    log.exception("Response encoding failed")
+    return _encoder.encode({
+        "jsonrpc": "2.0",
+        "result": {
+            "status": False,
+            "errors": {
+                "message": "Response is not serializable: %s" % error,
+                "code": "UNHANDLED",
+            },
+        },
+        "id": deserialized.get("id"),
+    })
+
+
+def is_streaming(response: Response) -> bool:
+    return not isinstance(response, NotificationResponse) and \
+        has_stream(response.deserialized())
+
+
+def iter_encode_response(response: Response, chunk_size=64 * 1024):
+    """
+    Кодирование ответа с потоковыми значениями. Возвращает итератор частей
+    тела ответа размером около chunk_size байт.
+    """
+    deserialized = response.deserialized()
+    chunks = []
+    size = 0
+    started = False
+    try:
+        for chunk in _iter_encode(deserialized, _encoder):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= chunk_size:
+                started = True
+                yield b"".join(chunks)
+                chunks = []
+                size = 0
+    except ENCODE_ERRORS as e:
+        if started:
+            raise
+
+        yield _encode_error(deserialized, e)
+        return
+
+    if chunks:
+        yield b"".join(chunks)
+
+
+def _iter_encode(obj, encoder):
+    if isinstance(obj, StreamingList):
+        yield b"["
+        separator = b""
+        for item in obj:
+            yield separator
+            yield encoder.encode(item)
+            separator = b","
+        yield b"]"
+
+    elif isinstance(obj, Deferred):
+        yield encoder.encode(obj.resolve())
+
+    elif isinstance(obj, dict) and has_stream(obj):
+        yield b"{"
+        separator = b""
+        for key, value in obj.items():
+            yield separator
+            yield encoder.encode(str(key))
+            yield b":"
+            yield from _iter_encode(value, encoder)
+            separator = b","
+        yield b"}"
+
+    else:
+        yield encoder.encode(obj)
@@ -1,6 +1,24 @@
+from collections import namedtuple
+
 import sqlalchemy as sa
 from sqlalchemy import desc, asc, or_, and_
+from sqlalchemy.orm.attributes import set_committed_value
+
+from nlab.db import Explain
+from nlab.rpc.cursor import decode_cursor, encode_cursor, seek_predicate
 from nlab.rpc.exceptions import ApiError
+from nlab.rpc.stream import StreamingList
+
+DEFAULT_LIMIT = 50
+
+# Режимы подсчёта общего количества строк в list методах
+TOTAL_EXACT = "exact"  # count(*) OVER (), точное значение
+TOTAL_ESTIMATE = "estimate"  # оценка планировщика PostgreSQL
+TOTAL_NONE = "none"  # не считается
+TOTAL_HAS_MORE = "has_more"  # только признак наличия следующей страницы
+TOTAL_MODES = (TOTAL_EXACT, TOTAL_ESTIMATE, TOTAL_NONE, TOTAL_HAS_MORE)
+
+Page = namedtuple("Page", "items total next_cursor has_more")
 
 
 class VersionNoObject(ValueError):
@@ -19,23 +37,204 @@ class VersionObject:
         self.create_session = create_session
 
     def filter(self, *, offset=None, limit=None, filter_q=None, filter_by_q=None, join=None, outerjoin=None, fetch_args=None,
-               group_by=None, order=None, form_items=None):
+               group_by=None, order=None, form_items=None, cursor=None, total=None, fields=None):
+        page = self.filter_page(offset=offset, limit=limit, filter_q=filter_q, filter_by_q=filter_by_q, join=join,
+                                outerjoin=outerjoin, fetch_args=fetch_args, group_by=group_by, order=order,
+                                form_items=form_items, cursor=cursor, total=total, fields=fields)
+        return page.items, page.total
+
+    def filter_page(self, *, offset=None, limit=None, filter_q=None, filter_by_q=None, join=None, outerjoin=None,
+                    fetch_args=None, group_by=None, order=None, form_items=None, cursor=None, total=None,
+                    fields=None):
+        """
+        Как filter, но дополнительно возвращает курсор следующей страницы.
+
+        При переданном cursor offset не используется, а total по умолчанию
+        не считается и равен None.
+
+        :param total: Режим подсчёта общего количества, один из TOTAL_MODES
+        :param fields: Список полей ответа, см. prepare_filter_q
+        :return: Page
+        """
         with self.create_session() as session:
             q = self.prepare_filter_q(offset=offset, limit=limit, filter_q=filter_q, filter_by_q=filter_by_q,
                                       join=join, outerjoin=outerjoin, fetch_args=fetch_args, group_by=group_by,
-                                      session=session, order=order)
+                                      session=session, order=order, cursor=cursor, total=total, fields=fields)
+
+            return self.fetch_page(q, session=session, offset=offset, limit=limit, order=order, cursor=cursor,
+                                   total=total, form_items=form_items, fields=fields)
+
+    def fetch_page(self, q, *, session, offset=None, limit=None, order=None, cursor=None, total=None,
+                   form_items=None, fields=None):
+        """
+        Выполнение запроса prepare_filter_q и сборка страницы.
+        Параметры должны совпадать с переданными в prepare_filter_q.
 
-            items = q.all()
-            total_items = 0
-            if items:
-                total_items = items[0][1]
-            result_items = form_items(items) if form_items else [it[0].to_dict() for it in items]
+        При переданных fields form_items получает сущности, у которых
+        незагруженные атрибуты равны None, и сам оставляет в ответе только
+        fields (через project).
+
+        :return: Page
+        """
+        if limit is None:
+            limit = DEFAULT_LIMIT
+
+        items, total_items, has_more = self._count(
+            q, session=session, total=self._total_mode(total, cursor), offset=offset, limit=limit
+        )
+
+        next_cursor = None
+        if has_more is not False:
+            next_cursor = self.next_cursor(items, limit=limit, order=order)
+
+        if fields:
+            for it in items:
+                self._skip_unloaded(it[0])
+
+        result_items = form_items(items) if form_items else [self.project(it[0].to_dict(), fields)
+                                                             for it in items]
+
+        return Page(result_items, total_items, next_cursor, has_more)
+
+    def _count(self, q, *, session, total, offset, limit):
+        """
+        Выполнение запроса и подсчёт total_items и has_more в режиме total.
+
+        :return: строки страницы, total_items, has_more
+        """
+        items = q.all()
+
+        total_items, has_more = None, None
+        if total == TOTAL_HAS_MORE:
+            # Запрос выбирает на одну строку больше limit
+            has_more = limit is not None and len(items) > limit
+            items = items[:limit]
+        elif total == TOTAL_EXACT:
+            total_items = items[0][1] if items else 0
+            has_more = (offset or 0) + len(items) < total_items
+        elif total == TOTAL_ESTIMATE:
+            total_items = self.estimate_total(q, session=session)
+
+        return items, total_items, has_more
+
+    def estimate_total(self, q, *, session):
+        """
+        Оценка количества строк запроса без его выполнения.
+
+        Для запроса без условий берётся pg_class.reltuples таблицы, иначе
+        число строк из плана EXPLAIN. Точность зависит от свежести
+        статистики (ANALYZE).
+        """
+        if q.whereclause is None:
+            reltuples = session.execute(
+                sa.text("SELECT reltuples FROM pg_class "
+                        "WHERE oid = to_regclass(:table_name)"),
+                {"table_name": q.column_descriptions[0]["entity"].__table__.name},
+            ).scalar()
+
+            # reltuples < 0, если таблица ещё не анализировалась
+            if reltuples is not None and reltuples >= 0:
+                return int(reltuples)
+
+        statement = q.limit(None).offset(None).order_by(None).statement
+        plan = session.connection().execute(Explain(statement)).scalar()
+
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def stream(self, *, offset=None, limit=None, filter_q=None, filter_by_q=None, join=None, outerjoin=None,
+               fetch_args=None, group_by=None, order=None, form_items=None, batch_size=500, fields=None,
+               cursor=None, total=None):
+        """
+        Потоковый вариант filter_page: строки читаются серверным курсором
+        пачками по batch_size при кодировании ответа, сессия живёт до конца
+        чтения.
+
+        total по умолчанию не считается: count(*) OVER () заставил бы базу
+        собрать весь результат до первой строки. В режиме exact количество
+        считается отдельным запросом перед чтением строк.
+
+        :return: StreamingList, total, next_cursor и has_more доступны через
+            его одноимённые атрибуты
+        """
+        total = self._total_mode(total, cursor, default=TOTAL_NONE)
+        if limit is None:
+            limit = DEFAULT_LIMIT
+
+        def prepare(session):
+            return self.prepare_filter_q(offset=offset, limit=limit, filter_q=filter_q, filter_by_q=filter_by_q,
+                                         join=join, outerjoin=outerjoin, fetch_args=fetch_args, group_by=group_by,
+                                         session=session, order=order, cursor=cursor, fields=fields,
+                                         total=TOTAL_HAS_MORE if total == TOTAL_HAS_MORE else TOTAL_NONE)
+
+        meta = {}
+        # Запрос строится и проверяется (cursor, fields, order) до ответа,
+        # чтобы ошибки параметров и подсчёта вернулись обычной ошибкой, а
+        # не во время кодирования. Строки читаются в отдельной сессии.
+        with self.create_session() as session:
+            q = prepare(session)
+            if total == TOTAL_EXACT:
+                meta["total"] = self.count_total(q)
+            elif total == TOTAL_ESTIMATE:
+                meta["total"] = self.estimate_total(q, session=session)
 
-            return result_items, total_items
+        def generate():
+            with self.create_session() as session:
+                q = prepare(session).execution_options(stream_results=True).yield_per(batch_size)
+
+                count, last = 0, None
+                for row in q:
+                    if count == limit:
+                        # Лишняя строка режима has_more
+                        streaming.meta["has_more"] = True
+                        break
+
+                    count += 1
+                    last = row
+                    if fields:
+                        self._skip_unloaded(row[0])
+                    yield form_items([row])[0] if form_items else self.project(row[0].to_dict(), fields)
+
+                if total == TOTAL_HAS_MORE:
+                    streaming.meta.setdefault("has_more", False)
+                elif total == TOTAL_EXACT:
+                    streaming.meta["has_more"] = (offset or 0) + count < streaming.meta["total"]
+
+                # Как в filter_page: без следующей страницы курсора нет
+                if streaming.meta.get("has_more") is not False and count == limit:
+                    streaming.meta["next_cursor"] = self.next_cursor([last], limit=1, order=order)
+
+        streaming = StreamingList(generate)
+        streaming.meta.update(meta)
+        return streaming
+
+    @staticmethod
+    def count_total(q):
+        """
+        Точное количество строк запроса prepare_filter_q без учёта offset
+        и limit отдельным запросом
+        """
+        return q.limit(None).offset(None).order_by(None).count()
 
     def versions(self, id, *, order=None, offset=None, limit=None,
                  filter_q=None, filter_by_q=None, fetch_args=None,
-                 form_items=None):
+                 form_items=None, total=None, options=None):
+        page = self.versions_page(id, order=order, offset=offset, limit=limit, filter_q=filter_q,
+                                  filter_by_q=filter_by_q, fetch_args=fetch_args, form_items=form_items,
+                                  total=total, options=options)
+        return page.items, page.total
+
+    def versions_page(self, id, *, order=None, offset=None, limit=None,
+                      filter_q=None, filter_by_q=None, fetch_args=None,
+                      form_items=None, total=None, options=None):
+        """
+        Как versions, но с признаком has_more. Курсоры для версий не
+        поддерживаются, next_cursor всегда None.
+
+        :param options: Опции загрузки сущности версии, например load_only
+
+        :return: Page
+        """
+        total = self._total_mode(total)
 
         with self.create_session() as session:
             q = self.prepare_versions_q(
@@ -47,30 +246,34 @@ class VersionObject:
                 fetch_args=fetch_args,
                 session=session,
                 order=order,
+                total=total,
+                options=options,
+            )
+
+            items, total_items, has_more = self._count(
+                q, session=session, total=total, offset=offset, limit=limit
             )
 
-            items = q.all()
-            total_items = 0
-            if items:
-                total_items = items[0][1]
             result_items = form_items(items) if form_items else [it[0].to_dict()
                                                                  for it in
                                                                  items]
 
-            return result_items, total_items
+            return Page(result_items, total_items, None, has_more)
 
     def prepare_versions_q(self, id, *, session, order=None, offset=None,
                            limit=None, filter_q=None, filter_by_q=None,
-                           fetch_args=None):
+                           fetch_args=None, total=None, options=None):
         if not order and hasattr(self.versions_entity, "version"):
             order = {"field": "version", "order": 1}
 
         if fetch_args is None:
             fetch_args = []
 
+        total = self._total_mode(total)
+
         q = session.query(
             self.versions_entity,
-            sa.over(sa.func.count()).label("total_items"),
+            self._total_column(total).label("total_items"),
             *fetch_args,
         )
 
@@ -79,6 +282,9 @@ class VersionObject:
 
         q = q.filter(self._version_object_key_field().in_(id))
 
+        if options:
+            q = q.options(*options)
+
         if filter_q:
             q = q.filter(*filter_q)
 
@@ -88,6 +294,9 @@ class VersionObject:
         if order:
             q = self._add_versions_order(q, order)
 
+        if total == TOTAL_HAS_MORE and limit is not None:
+            limit += 1
+
         q = q.offset(offset).limit(limit)
 
         return q
@@ -95,19 +304,28 @@ class VersionObject:
 
     def prepare_filter_q(self, *, session, offset=None, limit=None, filter_q=None, filter_by_q=None, join=None,
                          fetch_args=None, group_by=None, outerjoin=None,
-                         order=None):
-        if not order and hasattr(self.entity, "created"):
-            order = {"field": "created", "order": 1}
+                         order=None, cursor=None, total=None, fields=None):
+        """
+        :param fields: Список полей ответа (ключей to_dict). Из базы читаются
+            только нужные для них колонки и связи, остальные атрибуты
+            сущности не загружаются. None - все поля.
+        """
+        keys = self._order_keys(order)
+        total = self._total_mode(total, cursor)
 
         if fetch_args is None:
             fetch_args = []
 
         q = session.query(
             self.entity,
-            sa.over(sa.func.count()).label("total_items"),
+            self._total_column(total).label("total_items"),
             *fetch_args,
         )
 
+        if fields:
+            # Поля сортировки нужны для курсора следующей страницы
+            q = q.options(*self.load_options(fields, extra=[field for field, _ in keys]))
+
         if join:
             q = q.join(*join)
 
@@ -123,28 +341,109 @@ class VersionObject:
         if group_by:
             q = q.group_by(*group_by)
 
+        if cursor is not None:
+            values = decode_cursor(cursor, keys)
+            q = q.filter(seek_predicate(
+                [self.entity.__dict__[field] for field, _ in keys],
+                [direction for _, direction in keys],
+                values,
+            ))
+            offset = None
+
         if offset is None:
             offset = 0
 
         if limit is None:
-            limit = 50
+            limit = DEFAULT_LIMIT
 
-        if order:
-            q = self._add_order(q, order)
+        if total == TOTAL_HAS_MORE:
+            limit += 1
+
+        q = self._add_keys_order(q, keys)
 
         q = q.offset(offset).limit(limit)
 
         return q
 
-    def get(self, id, *, session=None):
+    def next_cursor(self, items, *, limit=None, order=None):
+        """
+        Курсор страницы, следующей за items (строки запроса
+        prepare_filter_q). None, если страница неполная.
+        """
+        if limit is None:
+            limit = DEFAULT_LIMIT
+
+        if not items or len(items) < limit:
+            return None
+
+        keys = self._order_keys(order)
+        last = items[-1][0]
+        return encode_cursor(keys, [getattr(last, field) for field, _ in keys])
+
+    def get(self, id, *, session=None, fields=None):
         if session:
-            it = self._fetch(id, session=session)
+            it = self._fetch(id, session=session, fields=fields)
         else:
             with self.create_session() as session:
-                it = self._fetch(id, session=session)
+                it = self._fetch(id, session=session, fields=fields)
 
         return it
 
+    def load_options(self, fields, extra=()):
+        """
+        Опции загрузки сущности для полей ответа fields: load_only нужных
+        колонок и noload ненужных связей.
+
+        Поле ответа соответствует одноимённому атрибуту модели, либо
+        атрибутам из FIELD_ATTRS модели, если поле вычисляется или
+        называется иначе.
+
+        :param extra: Дополнительно загружаемые атрибуты
+        """
+        if not isinstance(fields, (list, tuple)) or \
+                not all(isinstance(field, str) for field in fields):
+            raise ApiError(code="INVALID_PARAMS",
+                           message="fields must be a list of field names")
+
+        mapper = sa.inspect(self.entity)
+        field_attrs = getattr(self.entity, "FIELD_ATTRS", {})
+
+        attrs = set(extra)
+        for field in fields:
+            if field in field_attrs:
+                attrs.update(field_attrs[field])
+            elif field in mapper.column_attrs:
+                attrs.add(field)
+            else:
+                raise ApiError(code="INVALID_PARAMS",
+                               message="Unknown field %r of %s" % (field, self.name))
+
+        options = [sa.orm.Load(self.entity).load_only(*[key for key in attrs if key in mapper.column_attrs])]
+        options.extend(sa.orm.Load(self.entity).noload(relationship.key)
+                       for relationship in mapper.relationships
+                       if relationship.key not in attrs)
+        return options
+
+    @staticmethod
+    def project(item, fields):
+        """
+        Оставляет в словаре сущности только поля fields (все, если None)
+        """
+        if not fields:
+            return item
+
+        return {key: value for key, value in item.items() if key in fields}
+
+    @staticmethod
+    def _skip_unloaded(entity):
+        """
+        Незагруженные колонки становятся None, чтобы to_dict не вызывал
+        их отложенную загрузку отдельными запросами
+        """
+        state = sa.inspect(entity)
+        for key in state.unloaded & set(state.mapper.column_attrs.keys()):
+            set_committed_value(entity, key, None)
+
     def remove(self, id, session=None):
         if session:
             return self._remove(id=id, session=session)
@@ -158,7 +457,7 @@ class VersionObject:
 
         return True
 
-    def _fetch(self, pk=None, *, session, query_result=False, **kwargs):
+    def _fetch(self, pk=None, *, session, query_result=False, fields=None, **kwargs):
         if not ((pk is not None) ^ bool(kwargs)):
             raise RuntimeError("Either pk or kwargs must be given!")
 
@@ -170,13 +469,19 @@ class VersionObject:
             else:
                 kwargs = {self.primary_key: pk}
 
-        it = session.query(self.entity).filter_by(**kwargs)
+        it = session.query(self.entity)
+        if fields:
+            it = it.options(*self.load_options(fields))
+        it = it.filter_by(**kwargs)
 
         try:
             it_first = it.first()
         except sa.exc.DataError:
             raise ApiError(message="Invalid object id in request", code="INVALID_PARAMS")
 
+        if fields and it_first is not None:
+            self._skip_unloaded(it_first)
+
         return (it_first, it) if query_result else it_first
 
     def _remove(self, id, session):
@@ -205,6 +510,31 @@ class VersionObject:
         key_field = getattr(self.versions_entity, field or self.primary_key)
         return key_field
 
+    @staticmethod
+    def _total_mode(total, cursor=None, default=TOTAL_EXACT):
+        if total is None:
+            # Общее количество при чтении по курсору по умолчанию не считается
+            return default if cursor is None else TOTAL_NONE
+
+        if total not in TOTAL_MODES:
+            raise ApiError(code="INVALID_PARAMS",
+                           message="Unknown total mode %r, expected one of: %s" % (total, ", ".join(TOTAL_MODES)))
+
+        if cursor is not None and total in (TOTAL_EXACT, TOTAL_ESTIMATE):
+            raise ApiError(code="INVALID_PARAMS",
+                           message="Total mode %r can't be used with cursor" % total)
+
+        return total
+
+    @staticmethod
+    def _total_column(total):
+        # Колонка остаётся в запросе в любом режиме, чтобы форма строк
+        # (сущность, total_items, *fetch_args) не зависела от режима
+        if total == TOTAL_EXACT:
+            return sa.over(sa.func.count())
+
+        return sa.null()
+
     def _is_order_item_valid(self, item):
         if not isinstance(item, dict) or len(item) != 2:
             return False, "All sort field items must be dict with size 2"
@@ -232,14 +562,35 @@ class VersionObject:
             if not valid:
                 raise ValueError(text)
 
-    def _add_order(self, q, order):
+    def _order_keys(self, order):
+        """
+        Поля сортировки с направлениями. Первичный ключ всегда добавляется
+        последним, чтобы порядок строк был однозначным и по нему можно
+        было построить курсор.
+        """
+        if not order and hasattr(self.entity, "created"):
+            order = {"field": "created", "order": 1}
+
         if isinstance(order, dict):
             order = [order]
         self._validate_order(order)
+
+        keys = [(item["field"], item["order"]) for item in order or []]
+
+        primary_key = self.primary_key
+        if not isinstance(primary_key, tuple):
+            primary_key = (primary_key,)
+
+        fields = {field for field, _ in keys}
+        keys.extend((field, 1) for field in primary_key if field not in fields)
+
+        return keys
+
+    def _add_keys_order(self, q, keys):
         sort_direct = lambda field, order: asc(field) if order == 1 else \
             desc(field)
-        sorting = [sort_direct(self.entity.__dict__[item["field"]],
-                               item["order"]) for item in order]
+        sorting = [sort_direct(self.entity.__dict__[field], order)
+                   for field, order in keys]
         return q.order_by(*sorting)
 
     def _add_versions_order(self, q, order):
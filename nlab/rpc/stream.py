@@ -0,0 +1,68 @@
+"""
+Потоковые результаты RPC.
+
+StreamingList читает строки из базы по мере кодирования ответа, поэтому
+список любого размера не собирается в памяти целиком. Значения, которые
+становятся известны только во время чтения (например, total), передаются
+через Deferred и вычисляются при кодировании.
+"""
+
+
+class Deferred:
+    """
+    Значение, вычисляемое в момент кодирования ответа
+    """
+    def __init__(self, resolve):
+        self._resolve = resolve
+
+    def resolve(self):
+        return self._resolve()
+
+
+class StreamingList:
+    """
+    Ленивый список элементов ответа.
+
+    :param generate: Функция без аргументов, возвращающая итератор
+        элементов. Вызывается один раз при кодировании. Значения, которые
+        становятся известны во время чтения (total, next_cursor, has_more),
+        она сохраняет в meta, в ответ они попадают через Deferred.
+    """
+    def __init__(self, generate):
+        self._generate = generate
+        self._mappers = []
+        self.meta = {}
+        self.total = self.deferred("total")
+        self.next_cursor = self.deferred("next_cursor")
+        self.has_more = self.deferred("has_more")
+
+    def deferred(self, name):
+        """
+        Значение meta[name] на момент кодирования (None, если не задано).
+        В ответе должно стоять после самого списка.
+        """
+        return Deferred(lambda: self.meta.get(name))
+
+    def map(self, func):
+        self._mappers.append(func)
+        return self
+
+    def __iter__(self):
+        for item in self._generate():
+            for func in self._mappers:
+                item = func(item)
+            yield item
+
+
+def has_stream(obj):
+    """
+    Есть ли в ответе потоковые значения. Просматриваются только словари,
+    потоковые списки лежат в ответах list методов на верхних уровнях.
+    """
+    if isinstance(obj, (StreamingList, Deferred)):
+        return True
+
+    if isinstance(obj, dict):
+        return any(has_stream(value) for value in obj.values())
+
+    return False
@@ -1,9 +1,32 @@
 import html
+import re
 
 from bs4 import BeautifulSoup
 
+# Разметка, которую создаёт редактор IDE: <div>...</div> без вложенности,
+# <br> и несколько сущностей. Значения сущностей совпадают с BeautifulSoup
+_EDITOR_TOKEN = re.compile(
+    r"<div>|</div>|&(nbsp|amp|lt|gt|quot);|&#([0-9]{1,3});|[<&]"
+)
+_ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+_ENTITIES = {
+    "nbsp": "\xa0",
+    "amp": "&",
+    "lt": "<",
+    "gt": ">",
+    "quot": '"',
+}
+
 
 def transform_template_text(text):
+    out_text = _transform_editor_markup(text)
+    if out_text is None:
+        out_text = _transform_soup(text)
+
+    return out_text
+
+
+def _transform_soup(text):
     text = text.replace("<br>", "\n")
     soup = BeautifulSoup(text, "html.parser")
 
@@ -13,3 +36,62 @@ def transform_template_text(text):
     out_text = soup.text.strip()
     out_text2 = html.unescape(out_text)
     return out_text2
+
+
+def _transform_editor_markup(text):
+    """
+    Тот же результат, что у _transform_soup, за один проход без
+    построения дерева. Возвращает None, если в тексте есть разметка кроме
+    разметки редактора, тогда текст обрабатывается BeautifulSoup.
+    """
+    text = text.replace("<br>", "\n")
+
+    parts = []
+    node = []
+    in_div = False
+    position = 0
+    for match in _EDITOR_TOKEN.finditer(text):
+        node.append(text[position:match.start()])
+        position = match.end()
+
+        token = match.group()
+        if token == "<div>":
+            if in_div:
+                return None
+            in_div = True
+            _end_node(node, parts)
+        elif token == "</div>":
+            if not in_div:
+                return None
+            in_div = False
+            _end_node(node, parts)
+            parts.append("\n")
+        elif match.group(1):
+            node.append(_ENTITIES[match.group(1)])
+        elif match.group(2) and int(match.group(2)) < 128:
+            node.append(chr(int(match.group(2))))
+        else:
+            # Другие теги, сущности, одиночные < и &
+            return None
+
+    if in_div or position == len(text) and text.endswith(";"):
+        # Незакрытый div и сущность в самом конце текста разбираются
+        # html.parser по-особому
+        return None
+
+    node.append(text[position:])
+    _end_node(node, parts)
+    return html.unescape("".join(parts).strip())
+
+
+def _end_node(node, parts):
+    """
+    Текстовый узел между тегами. Как и BeautifulSoup, узел только из
+    пробельных символов ASCII заменяется одним пробелом или переводом
+    строки.
+    """
+    data = "".join(node)
+    node.clear()
+    if data and not data.strip(_ASCII_SPACES):
+        data = "\n" if "\n" in data else " "
+    parts.append(data)
@@ -25,3 +25,112 @@ POSTGRES_DB = os.getenv("NLAB_ARM_POSTGRES_DB")
 POSTGRES_PORT = os.getenv("NLAB_ARM_POSTGRES_PORT", "5432")
 
 COMPILER_TARGET = os.getenv("NLAB_ARM_COMPILER_TARGET", "sova-engine")
+
+# Размеры пулов потоков асинхронной точки входа (gateway_asgi.py)
+GATEWAY_DB_WORKERS = int(os.getenv("NLAB_ARM_GATEWAY_DB_WORKERS", "10"))
+GATEWAY_PROCESSOR_WORKERS = int(
+    os.getenv("NLAB_ARM_GATEWAY_PROCESSOR_WORKERS", "32")
+)
+
+# Через сколько версий словаря хранится полная копия content,
+# между ними хранятся сжатые разницы с предыдущей версией
+DICTIONARY_SNAPSHOT_INTERVAL = int(
+    os.getenv("NLAB_ARM_DICTIONARY_SNAPSHOT_INTERVAL", "20")
+)
+
+# Параллельное выполнение пакетных (batch) JSON-RPC запросов
+GATEWAY_BATCH_WORKERS = int(os.getenv("NLAB_ARM_GATEWAY_BATCH_WORKERS", "16"))
+GATEWAY_BATCH_CONCURRENCY = int(
+    os.getenv("NLAB_ARM_GATEWAY_BATCH_CONCURRENCY", "4")
+)
+GATEWAY_BATCH_MEMBER_TIMEOUT = float(
+    os.getenv("NLAB_ARM_GATEWAY_BATCH_MEMBER_TIMEOUT", "60")
+)
+
+# Запись статистики срабатываний шаблонов (template.stats.ingest):
+# период записи в базу в секундах, ограничение числа накопленных в памяти
+# пар (шаблон, день) и размер одного пакета событий
+TEMPLATE_STATS_FLUSH_INTERVAL = float(
+    os.getenv("NLAB_ARM_TEMPLATE_STATS_FLUSH_INTERVAL", "10")
+)
+TEMPLATE_STATS_MAX_BUCKETS = int(
+    os.getenv("NLAB_ARM_TEMPLATE_STATS_MAX_BUCKETS", "100000")
+)
+TEMPLATE_STATS_MAX_BATCH = int(
+    os.getenv("NLAB_ARM_TEMPLATE_STATS_MAX_BATCH", "100000")
+)
+
+# Ограничение суммарной длины (в символах) исходных и преобразованных
+# текстов в кэше transform_template_text (режим _process), 0 - без кэша
+TRANSFORM_CACHE_MAX_CHARS = int(
+    os.getenv("NLAB_ARM_TRANSFORM_CACHE_MAX_CHARS", "20000000")
+)
+
+# Клиент процессора: ограничения времени соединения и ожидания ответа
+# в секундах и число открытых keep-alive соединений
+PROCESSOR_CONNECT_TIMEOUT = float(
+    os.getenv("NLAB_ARM_PROCESSOR_CONNECT_TIMEOUT", "5")
+)
+PROCESSOR_READ_TIMEOUT = float(
+    os.getenv("NLAB_ARM_PROCESSOR_READ_TIMEOUT", "60")
+)
+PROCESSOR_POOL_SIZE = int(os.getenv("NLAB_ARM_PROCESSOR_POOL_SIZE", "32"))
+
+# Защита от недоступного процессора: число одновременных запросов одного
+# метода и время ожидания места в секундах, число отказов подряд до
+# отключения и время до пробного запроса, повторы task.info и task.list
+PROCESSOR_METHOD_CONCURRENCY = int(
+    os.getenv("NLAB_ARM_PROCESSOR_METHOD_CONCURRENCY", "8")
+)
+PROCESSOR_BULKHEAD_TIMEOUT = float(
+    os.getenv("NLAB_ARM_PROCESSOR_BULKHEAD_TIMEOUT", "1")
+)
+PROCESSOR_FAILURE_THRESHOLD = int(
+    os.getenv("NLAB_ARM_PROCESSOR_FAILURE_THRESHOLD", "5")
+)
+PROCESSOR_RESET_TIMEOUT = float(
+    os.getenv("NLAB_ARM_PROCESSOR_RESET_TIMEOUT", "30")
+)
+PROCESSOR_RETRIES = int(os.getenv("NLAB_ARM_PROCESSOR_RETRIES", "2"))
+PROCESSOR_RETRY_BACKOFF = float(
+    os.getenv("NLAB_ARM_PROCESSOR_RETRY_BACKOFF", "0.2")
+)
+
+# Кэш списка компиляторов процессора (cluster.complect_info): сколько
+# секунд список свежий и сколько ещё возвращается устаревший список,
+# пока загружается новый
+CLUSTER_COMPILERS_TTL = float(
+    os.getenv("NLAB_ARM_CLUSTER_COMPILERS_TTL", "300")
+)
+CLUSTER_COMPILERS_STALE_TTL = float(
+    os.getenv("NLAB_ARM_CLUSTER_COMPILERS_STALE_TTL", "86400")
+)
+
+# Сколько секунд ответ на task.info, task.list и complect_revision.*
+# возвращается на одинаковые запросы без обращения к процессору,
+# 0 - объединяются только одновременные запросы
+PROCESSOR_COALESCE_TTL = float(
+    os.getenv("NLAB_ARM_PROCESSOR_COALESCE_TTL", "1")
+)
+
+# Подписка на состояние задач (task.watch и /tasks/<task_id>/events):
+# период опроса процессора, через сколько секунд без клиентов опрос задачи
+# прекращается, максимальное время ожидания task.watch и ограничение числа
+# опрашиваемых задач
+TASK_WATCH_POLL_INTERVAL = float(
+    os.getenv("NLAB_ARM_TASK_WATCH_POLL_INTERVAL", "1")
+)
+TASK_WATCH_IDLE_TIMEOUT = float(
+    os.getenv("NLAB_ARM_TASK_WATCH_IDLE_TIMEOUT", "60")
+)
+TASK_WATCH_MAX_WAIT = float(os.getenv("NLAB_ARM_TASK_WATCH_MAX_WAIT", "25"))
+TASK_WATCH_MAX_TASKS = int(os.getenv("NLAB_ARM_TASK_WATCH_MAX_TASKS", "1000"))
+# Сколько task.watch ждут одновременно (размер отдельного пула потоков в
+# асинхронной точке входа), остальные завершаются ошибкой OVERLOADED, и
+# сколько запросов task.info опроса выполняются одновременно
+TASK_WATCH_MAX_WAITERS = int(
+    os.getenv("NLAB_ARM_TASK_WATCH_MAX_WAITERS", "16")
+)
+TASK_WATCH_FETCH_WORKERS = int(
+    os.getenv("NLAB_ARM_TASK_WATCH_FETCH_WORKERS", "4")
+)
@@ -1,8 +1,11 @@
 import sqlalchemy
 from sqlalchemy import Table, MetaData, Column, Integer, String, Boolean, \
-    BigInteger, DateTime, TEXT, func, ForeignKey, UniqueConstraint
+    BigInteger, DateTime, TEXT, func, ForeignKey, UniqueConstraint, \
+    LargeBinary, Index, Date
 from sqlalchemy.dialects.postgresql import ENUM, UUID, JSONB, ARRAY
 
+from nlab.db import to_tsvector
+
 metadata = MetaData()
 
 ELEMENT_STATUSES = ("active", "inactive")
@@ -10,6 +13,14 @@ ELEMENT_STATUSES = ("active", "inactive")
 element_statuses = ENUM(*ELEMENT_STATUSES, name="status")
 
 
+def trgm_index(name, column):
+    """
+    GIN индекс pg_trgm для поиска подстроки (ILIKE '%...%') по колонке
+    """
+    return Index(name, column, postgresql_using="gin",
+                 postgresql_ops={column: "gin_trgm_ops"})
+
+
 users_table = Table(
     "users", metadata,
     Column("id", BigInteger, primary_key=True, autoincrement=False),
@@ -36,6 +47,8 @@ profiles_table = Table(
     Column("meta", JSONB, server_default="{}", nullable=False),
     Column("is_enabled", Boolean, server_default="t", nullable=False),
     Column("engine_id", Integer, server_default="1", nullable=False),
+
+    trgm_index("profiles_name_trgm", "name"),
 )
 
 
@@ -54,6 +67,9 @@ suites_table = Table(
     Column("is_enabled", Boolean, default=True, nullable=False),
     Column("hidden", Boolean, default=False, nullable=False),
     Column("meta", JSONB, server_default="{}", nullable=False),
+
+    Index("suites_profile_id", "profile_id"),
+    trgm_index("suites_title_trgm", "title"),
 )
 
 
@@ -74,9 +90,29 @@ templates_table = Table(
     Column("is_compilable", Boolean, default=True, nullable=False),
     Column("meta", JSONB, server_default="{}", nullable=False),
 
+    # Уникальный индекс (suite_id, position) используется и для выборки
+    # шаблонов набора
     UniqueConstraint(
         "suite_id", "position", name="suite_id_positions",
     ),
+    trgm_index("templates_content_trgm", "content"),
+)
+
+# Полнотекстовый поиск, выражение совпадает с запросом в
+# components_utils/search.py
+Index("templates_content_fts", to_tsvector(templates_table.c.content),
+      postgresql_using="gin")
+
+
+# Статистика срабатываний шаблонов: счётчик за день и время последнего
+# срабатывания, см. components_utils/template_stats.py
+template_stats_table = Table(
+    "template_stats", metadata,
+    Column("template_id", UUID, ForeignKey("templates.id", ondelete="CASCADE"),
+           nullable=False, primary_key=True),
+    Column("day", Date, nullable=False, primary_key=True),
+    Column("hits", BigInteger, server_default="0", nullable=False),
+    Column("last_hit", DateTime(timezone=True), nullable=False),
 )
 
 
@@ -101,8 +137,18 @@ dictionaries_table = Table(
            server_default=sqlalchemy.text("ARRAY[]::UUID[]"), nullable=False),
     Column("is_enabled", Boolean, server_default="t", nullable=False),
     Column("parts", JSONB, server_default="{}", nullable=False),
+
+    # Фильтр profile_ids @> ARRAY[...]
+    Index("dictionaries_profile_ids", "profile_ids", postgresql_using="gin"),
+    trgm_index("dictionaries_title_trgm", "title"),
+    # content словаря может быть больше ограничения tsvector в 1 МБ,
+    # поэтому по нему ищется только подстрока
+    trgm_index("dictionaries_content_trgm", "content"),
 )
 
+Index("dictionaries_title_fts", to_tsvector(dictionaries_table.c.title),
+      postgresql_using="gin")
+
 
 dictionaries_versions_table = Table(
     "dictionaries_versions", metadata,
@@ -123,6 +169,16 @@ dictionaries_versions_table = Table(
     Column("profile_ids", ARRAY(UUID)),
     Column("is_enabled", Boolean),
     Column("parts", JSONB),
+    # Версия хранит либо content целиком, либо сжатую разницу с предыдущей
+    # версией (delta), см. components_utils/version_history.py
+    Column("delta", LargeBinary, nullable=True),
+    Column("delta_depth", Integer, server_default="0", nullable=False),
+    # Размер content в байтах и его sha256, чтобы список версий не читал
+    # и не восстанавливал content
+    Column("content_size", BigInteger, nullable=True),
+    Column("content_hash", TEXT, nullable=True),
+
+    Index("dictionaries_versions_id_version", "id", "version"),
 )
 
 
@@ -144,6 +200,8 @@ complects_table = Table(
     Column("compiler_target", String, server_default="", nullable=False),
     Column("debug_target", String, server_default="", nullable=False),
     Column("deploy_target", String, server_default="", nullable=False),
+
+    trgm_index("complects_name_trgm", "name"),
 )
 
 
@@ -160,7 +218,10 @@ testcase_table = Table(
     Column("description", TEXT),
     Column("replicas", ARRAY(String), nullable=False),
     Column("is_common", Boolean, default=True, nullable=False),
-    Column("author", BigInteger, nullable=False)
+    Column("author", BigInteger, nullable=False),
+
+    Index("testcase_profile_id", "profile_id"),
+    trgm_index("testcase_title_trgm", "title"),
 )
 
 access_profile_user_table = Table(
@@ -168,7 +229,11 @@ access_profile_user_table = Table(
     Column("user_id", UUID, nullable=False, primary_key=True),
     Column("profile_id", UUID, ForeignKey("profiles.id"), nullable=False,
            primary_key=True),
-    Column("permissions", JSONB, server_default="{}", nullable=False)
+    Column("permissions", JSONB, server_default="{}", nullable=False),
+
+    # Выборка по user_id идёт по первичному ключу (user_id, profile_id),
+    # индекс нужен для удаления доступов профиля
+    Index("access_profile_user_profile_id", "profile_id"),
 )
 
 
@@ -184,6 +249,8 @@ access_profile_account_table = Table(
     Column("account_id", UUID, nullable=False, primary_key=True),
     Column("profile_id", UUID, ForeignKey("profiles.id"), nullable=False,
            primary_key=True),
+
+    Index("access_profile_account_profile_id", "profile_id"),
 )
 
 
@@ -0,0 +1,56 @@
+import pytest
+
+from components_utils.positions import apply_moves, target_position
+from nlab.rpc.exceptions import ApiError
+
+POSITIONS = {"a": 1, "b": 2, "c": 3}
+
+
+@pytest.mark.parametrize("argument", ["position_before", "position_after"])
+def test_target_position_first(argument):
+    assert target_position(POSITIONS, **{argument: "first"}) == 1
+
+
+@pytest.mark.parametrize("argument", ["position_before", "position_after"])
+def test_target_position_last(argument):
+    assert target_position(POSITIONS, **{argument: "last"}) == 4
+
+
+def test_target_position_last_of_empty_suite():
+    assert target_position({}, position_before="last") == 1
+
+
+def test_target_position_template():
+    assert target_position(POSITIONS, position_before="b") == 2
+    assert target_position(POSITIONS, position_after="b") == 3
+
+
+@pytest.mark.parametrize("position", [0, -1, True, "1", 1.5])
+def test_target_position_invalid(position):
+    with pytest.raises(ApiError) as error:
+        target_position(POSITIONS, position=position)
+    assert error.value.code == "INVALID_POSITION"
+
+
+def test_apply_moves():
+    assert apply_moves(POSITIONS, [("c", 1)]) == {"a": 2, "b": 3, "c": 1}
+
+
+def test_apply_moves_resolves_targets_in_order():
+    moves = [("x", {"position_before": "b"}),
+             ("y", {"position_after": "b"}),
+             ("z", {"position_before": "last"})]
+    result = apply_moves(POSITIONS, moves, new_ids=["x", "y", "z"])
+    assert result == {"a": 1, "x": 2, "b": 3, "y": 4, "c": 5, "z": 6}
+
+
+def test_apply_moves_after_last_keeps_gaps():
+    result = apply_moves(POSITIONS, [("x", 10), ("y", {"position_after": "last"})],
+                         new_ids=["x", "y"])
+    assert result == {"a": 1, "b": 2, "c": 3, "x": 10, "y": 11}
+
+
+def test_apply_moves_unknown_template():
+    with pytest.raises(ApiError) as error:
+        apply_moves(POSITIONS, [("x", 1)])
+    assert error.value.code == "NOT_EXISTS"
@@ -0,0 +1,49 @@
+import pytest
+
+from processor import (_transform_editor_markup, _transform_soup,
+                       transform_template_text)
+
+GOLDEN = (
+    ("", ""),
+    ("  plain text  ", "plain text"),
+    ("line<br>line", "line\nline"),
+    ("<div>first</div><div>second</div>", "first\nsecond"),
+    ("intro<div>line</div>tail", "introline\ntail"),
+    ("<div><br></div><div>x</div>", "x"),
+    ("a&nbsp;b", "a\xa0b"),
+    ("&lt;div&gt; is text", "<div> is text"),
+    ("&amp;lt;", "<"),
+    ("say &quot;hi&quot;", 'say "hi"'),
+    ("it&#39;s", "it's"),
+    ("<div>a &amp; b</div>", "a & b"),
+    ("* {x} *", "* {x} *"),
+    ("$Var <br> $Other", "$Var \n $Other"),
+    ("<div>привет, мир</div><div>как дела?</div>", "привет, мир\nкак дела?"),
+    # Разметка не из редактора, обрабатывается BeautifulSoup
+    ("<div><div>nested</div></div>", "nested"),
+    ("<b>bold</b> text", "bold text"),
+    ("<div class='x'>attr</div>", "attr"),
+    ("a < b", "a < b"),
+    ("a & b", "a & b"),
+    ("&#150;", "–"),
+    ("&copy; 2020", "\xa9 2020"),
+    ("<div>unclosed", "unclosed"),
+    ("x&amp;", "x&"),
+    ("<div>a</div> \t <div>b</div>", "a\n b"),
+    ("<div>\t</div>x", "x"),
+    ("<!-- comment -->text", "text"),
+)
+
+
+@pytest.mark.parametrize("text, expected", GOLDEN)
+def test_transform_template_text(text, expected):
+    assert _transform_soup(text) == expected
+    assert transform_template_text(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", GOLDEN)
+def test_editor_markup_matches_soup(text, expected):
+    # Быстрый разбор либо отказывается от текста, либо совпадает с
+    # BeautifulSoup
+    fast = _transform_editor_markup(text)
+    assert fast is None or fast == _transform_soup(text)